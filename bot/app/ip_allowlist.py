@@ -0,0 +1,93 @@
+import bisect
+import functools
+import ipaddress
+import logging
+from typing import Iterable, Optional
+
+from aiohttp import web
+from aiohttp.web_request import Request
+
+import glv
+
+FORWARDED_FOR = 'x-forwarded-for'
+
+def _parse_address(value: str):
+    try:
+        return ipaddress.ip_address(value.strip())
+    except ValueError:
+        return None
+
+class IPAllowlist:
+    def __init__(self, entries: Iterable[str]):
+        intervals = {4: [], 6: []}
+        for entry in entries:
+            entry = entry.strip()
+            if not entry:
+                continue
+            network = ipaddress.ip_network(entry, strict=False)
+            intervals[network.version].append((int(network.network_address), int(network.broadcast_address)))
+
+        self._starts = {}
+        self._ends = {}
+        for version, ranges in intervals.items():
+            merged = []
+            for start, end in sorted(ranges):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+                else:
+                    merged.append((start, end))
+            self._starts[version] = [start for start, _ in merged]
+            self._ends[version] = [end for _, end in merged]
+
+    def __contains__(self, address) -> bool:
+        if isinstance(address, str):
+            address = _parse_address(address)
+        if address is None:
+            return False
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        starts = self._starts[address.version]
+        value = int(address)
+        index = bisect.bisect_right(starts, value) - 1
+        return index >= 0 and value <= self._ends[address.version][index]
+
+    def __bool__(self) -> bool:
+        return any(self._starts.values())
+
+def split_config(value: Optional[str]) -> list:
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
+
+trusted_proxies = IPAllowlist(split_config(glv.config['TRUSTED_PROXIES']))
+
+def get_client_ip(request: Request, proxies: IPAllowlist = None, header: str = None) -> Optional[str]:
+    proxies = trusted_proxies if proxies is None else proxies
+    header = glv.config['CLIENT_IP_HEADER'] if header is None else header
+    remote = request.remote
+    if not header or remote is None or remote not in proxies:
+        return remote
+
+    value = request.headers.get(header)
+    if not value:
+        return remote
+    if header.lower() != FORWARDED_FOR:
+        return value.strip() if _parse_address(value) is not None else remote
+
+    for hop in reversed([hop.strip() for hop in value.split(',') if hop.strip()]):
+        if _parse_address(hop) is None:
+            break
+        if hop not in proxies:
+            return hop
+    return remote
+
+def allow_ips(allowlist: IPAllowlist):
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request: Request):
+            client_ip = get_client_ip(request)
+            if client_ip not in allowlist:
+                logging.warning(f"Rejected {request.method} {request.path} from {client_ip} (remote {request.remote})")
+                return web.Response(status=403)
+            request['client_ip'] = client_ip
+            return await handler(request)
+        return wrapper
+    return decorator
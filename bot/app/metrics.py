@@ -0,0 +1,58 @@
+import time
+import logging
+
+from aiohttp import web
+from aiohttp.web_request import Request
+
+from app.ip_allowlist import IPAllowlist, allow_ips, split_config
+from app.routes import notification_queue
+from panel import get_panel
+import metrics
+import resilience
+import glv
+
+METRICS_IPS = IPAllowlist(split_config(glv.config['METRICS_ALLOWED_IPS']))
+
+@web.middleware
+async def metrics_middleware(request: Request, handler):
+    started = time.monotonic()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else 'unmatched'
+        metrics.webhook_latency.observe(time.monotonic() - started, route=route, method=request.method, status=str(status))
+
+def _runtime_collector() -> list:
+    result = []
+    try:
+        stats = get_panel().cache_stats()
+    except Exception as e:
+        logging.warning(f"Metrics: failed to read panel cache stats: {e}")
+        stats = None
+    if stats:
+        for key in ('hits', 'misses', 'coalesced', 'evictions', 'invalidations'):
+            result.append((f'panel_cache_{key}_total', 'counter', f'Panel profile cache {key}', [({}, stats[key])]))
+        result.append(('panel_cache_size', 'gauge', 'Panel profile cache entries', [({}, stats['size'])]))
+
+    result.append(('notification_queue_size', 'gauge', 'Remnawave events waiting to be processed', [({}, len(notification_queue))]))
+    result.append(('notification_queue_coalesced_total', 'counter', 'Remnawave events replaced by a newer one', [({}, notification_queue.coalesced)]))
+    result.append(('notification_queue_rejected_total', 'counter', 'Remnawave events rejected with 503', [({}, notification_queue.rejected)]))
+
+    states = (resilience.CLOSED, resilience.HALF_OPEN, resilience.OPEN)
+    result.append(('circuit_state', 'gauge', 'Circuit breaker state (0 closed, 1 half-open, 2 open)', [({'circuit': b.name}, states.index(b.state)) for b in resilience.breakers]))
+    result.append(('circuit_opened_total', 'counter', 'Times a circuit breaker opened', [({'circuit': b.name}, b.opened_total) for b in resilience.breakers]))
+    result.append(('circuit_rejected_total', 'counter', 'Calls rejected by an open circuit breaker', [({'circuit': b.name}, b.rejected_total) for b in resilience.breakers]))
+    return result
+
+metrics.register_collector(_runtime_collector)
+
+@allow_ips(METRICS_IPS)
+async def metrics_handler(request: Request):
+    return web.Response(text=metrics.render(), content_type='text/plain; version=0.0.4', charset='utf-8')
@@ -1,5 +1,4 @@
 import asyncio
-import ipaddress
 import logging
 from datetime import datetime, timedelta
 import hmac
@@ -12,7 +11,6 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from db.methods import (
     get_vpn_user,
-    get_marzban_profile_by_vpn_id,
     get_payment,
     delete_payment,
     confirm_payment,
@@ -22,18 +20,21 @@ from db.methods import (
     use_all_promo_codes,
     has_confirmed_payments,
     get_last_traffic_notification,
-    add_traffic_notification
+    add_traffic_notification,
+    add_payment_inbox_event,
+    unit_of_work
 )
 from keyboards import get_main_menu_keyboard, get_buy_more_traffic_keyboard, get_renew_subscription_keyboard, get_install_subscription_keyboard, get_payment_success_keyboard
-from utils import webhook_data, goods, referrals
+from utils import webhook_data, goods, referrals, yookassa
 from utils import get_i18n_string
+from utils.payment_inbox import PaymentInboxWorker, PAYMENT_EVENT_PAID, PAYMENT_EVENT_CANCEL
+from utils.notification_queue import NotificationQueue
 from panel import get_panel
+from app.ip_allowlist import IPAllowlist, allow_ips
 
 import glv
 
-_background_tasks: set = set()
-
-YOOKASSA_IPS = (
+YOOKASSA_IPS = IPAllowlist((
     "185.71.76.0/27",
     "185.71.77.0/27",
     "77.75.153.0/25",
@@ -41,7 +42,11 @@ YOOKASSA_IPS = (
     "77.75.156.35",
     "77.75.154.128/25",
     "2a02:5180::/32"
-)
+))
+
+CRYPTOMUS_IPS = IPAllowlist((
+    "91.227.144.54",
+))
 
 
 async def _send_or_edit_result(chat_id: int, message_id, text: str, reply_markup):
@@ -106,6 +111,9 @@ async def _process_payment_success(payment, good, user):
             referee_bonus_days = await referrals.get_referee_bonus_days(payment.tg_id, purchase_days)
 
         if good['type'] == 'update':
+            async with unit_of_work():
+                await confirm_payment(payment.payment_id)
+                await use_all_promo_codes(payment.tg_id)
             await _send_or_edit_result(
                 payment.tg_id,
                 payment.message_id,
@@ -113,8 +121,10 @@ async def _process_payment_success(payment, good, user):
                 get_payment_success_keyboard(payment.lang, payment.from_notification),
             )
         else:
-            await confirm_payment(payment.payment_id)
-            user_has_payments = await has_confirmed_payments(payment.tg_id)
+            async with unit_of_work():
+                await confirm_payment(payment.payment_id)
+                user_has_payments = await has_confirmed_payments(payment.tg_id)
+                await use_all_promo_codes(payment.tg_id)
             if user_has_payments:
                 if referee_bonus_days > 0:
                     text = get_i18n_string("message_payment_success_with_bonus", payment.lang).format(days=referee_bonus_days)
@@ -135,8 +145,6 @@ async def _process_payment_success(payment, good, user):
                     get_install_subscription_keyboard(subscription_url, payment.lang),
                 )
 
-        await use_all_promo_codes(payment.tg_id)
-
         if good.get("type") == "renew" and "months" in good:
             try:
                 await referrals.apply_referral_bonuses(
@@ -148,10 +156,7 @@ async def _process_payment_success(payment, good, user):
             except Exception as ref_error:
                 logging.error(f"Failed to apply referral bonuses for user {payment.tg_id}: {ref_error}")
     except Exception as e:
-        logging.error(
-            f"Failed to process subscription for user {payment.tg_id} after payment {payment.payment_id}: {e}",
-            exc_info=True
-        )
+        logging.error(f"Failed to process subscription for user {payment.tg_id} after payment {payment.payment_id}: {e}", exc_info=True)
         error_text = get_i18n_string("message_error", payment.lang)
         support_link = glv.config.get('SUPPORT_LINK', '')
         if support_link:
@@ -163,86 +168,102 @@ async def _process_payment_success(payment, good, user):
             )
         except Exception:
             pass
+        raise
 
-async def check_crypto_payment(request: Request):
-    client_ip = request.headers.get('CF-Connecting-IP') or request.headers.get('X-Real-IP') or request.headers.get('X-Forwarded-For') or request.remote
-    if client_ip not in ["91.227.144.54"]:
-        return web.Response(status=403)
-    data = await request.json()
-    if not webhook_data.check(data, glv.config['CRYPTO_TOKEN']):
-        return web.Response(status=403)
-    payment = await get_payment(data['order_id'], PaymentPlatform.CRYPTOMUS)
+async def _handle_payment_event(event):
+    payment = await get_payment(event.payment_id, PaymentPlatform(event.provider))
     if payment is None:
-        return web.Response()
-    
-    if data['status'] in ['paid', 'paid_over']:
+        logging.info(f"Payment {event.payment_id} no longer exists, skipping {event.event} event")
+        return
+
+    if event.event == PAYMENT_EVENT_PAID:
+        if payment.confirmed:
+            logging.info(f"Payment {event.payment_id} is already confirmed, skipping {event.event} event")
+            return
         good = goods.get(payment.callback)
         user = await get_vpn_user(payment.tg_id)
         await _process_payment_success(payment, good, user)
-    
-    if data['status'] == 'cancel':
+    elif event.event == PAYMENT_EVENT_CANCEL:
         await delete_payment(payment.payment_id)
-    
-    return web.Response()
 
-def _check_ip_in_subnets(client_ip: str, subnets: tuple) -> bool:
-    for subnet in subnets:
-        if "/" in subnet:
-            if ipaddress.ip_address(client_ip) in ipaddress.ip_network(subnet):
-                return True
-        else:
-            if client_ip == subnet:
-                return True
-    return False
+payment_inbox = PaymentInboxWorker(_handle_payment_event)
 
+async def _enqueue_payment_event(platform: PaymentPlatform, payment_id: str, event: str):
+    payment = await get_payment(payment_id, platform)
+    if payment is None:
+        return web.Response()
 
-async def check_yookassa_payment(request: Request):
-    client_ip = request.headers.get('CF-Connecting-IP') or request.headers.get('X-Real-IP') or request.headers.get('X-Forwarded-For') or request.remote
-    if not _check_ip_in_subnets(client_ip, YOOKASSA_IPS):
+    try:
+        inserted = await add_payment_inbox_event(platform, payment_id, payment.tg_id, event)
+    except Exception as e:
+        logging.error(f"Failed to store {platform.name} {event} event for payment {payment_id}: {e}", exc_info=True)
+        return web.Response(status=500)
+
+    if inserted:
+        payment_inbox.notify()
+    else:
+        logging.info(f"Duplicate {platform.name} webhook for payment {payment_id} ignored")
+    return web.Response()
+
+@allow_ips(CRYPTOMUS_IPS)
+async def check_crypto_payment(request: Request):
+    data = await request.json()
+    if not webhook_data.check(data, glv.config['CRYPTO_TOKEN']):
         return web.Response(status=403)
+    if data['status'] in ['paid', 'paid_over']:
+        event = PAYMENT_EVENT_PAID
+    elif data['status'] == 'cancel':
+        event = PAYMENT_EVENT_CANCEL
+    else:
+        return web.Response()
     
+    return await _enqueue_payment_event(PaymentPlatform.CRYPTOMUS, data['order_id'], event)
+
+@allow_ips(YOOKASSA_IPS)
+async def check_yookassa_payment(request: Request):
     data = (await request.json())['object']
-    payment = await get_payment(data['id'], PaymentPlatform.YOOKASSA)
-    if payment is None:
+    if data['status'] not in ['succeeded', 'canceled']:
         return web.Response()
-    
-    if data['status'] in ['succeeded']:
-        good = goods.get(payment.callback)
-        user = await get_vpn_user(payment.tg_id)
-        await _process_payment_success(payment, good, user)
-    
-    if data['status'] == 'canceled':
-        await delete_payment(payment.payment_id)
-    
-    return web.Response()
+
+    try:
+        status = await yookassa.get_payment_status(data['id'])
+    except Exception as e:
+        logging.error(f"Failed to verify YooKassa payment {data['id']}: {e}")
+        return web.Response(status=500)
+    if status != data['status']:
+        logging.warning(f"YooKassa webhook for payment {data['id']} claims '{data['status']}' but the API reports '{status}'")
+        return web.Response()
+
+    if status == 'succeeded':
+        event = PAYMENT_EVENT_PAID
+    else:
+        event = PAYMENT_EVENT_CANCEL
+    return await _enqueue_payment_event(PaymentPlatform.YOOKASSA, data['id'], event)
+
+NOTIFY_EVENTS = ('user.bandwidth_usage_threshold_reached', 'user.expiration', 'user.expired', 'user.limited', 'user.not_connected')
 
 async def notify_user(request: Request):
     signature = request.headers.get('x-remnawave-signature')
     if not signature:
         return web.Response(status=403)
     payload_bytes = await request.read()
-    payload = json.loads(payload_bytes)
-    logging.info(f"payload: {payload}")
     webhook_secret = str(glv.config['WEBHOOK_SECRET']).encode('utf-8')
     computed_signature = hmac.new(
         key=webhook_secret,
         msg=payload_bytes,
         digestmod=hashlib.sha256
     ).hexdigest()
-    logging.info(f"sign: {signature}, computed:{computed_signature}")
     if not hmac.compare_digest(signature, computed_signature):
+        logging.warning(f"Rejected Remnawave webhook with invalid signature from {request.remote}")
         return web.Response(status=403)
-    if payload['event'] not in ['user.bandwidth_usage_threshold_reached', 'user.expiration', 'user.expired', 'user.limited', 'user.not_connected']:
+    payload = json.loads(payload_bytes)
+    logging.debug(f"payload: {payload}")
+    if payload['event'] not in NOTIFY_EVENTS:
         return web.Response()
     vpn_id = payload['data']['username']
-    user = await get_marzban_profile_by_vpn_id(vpn_id)
-    if user is None:
-        logging.info(f"No user found id={vpn_id}")
-        return web.Response(status=404)
-
-    task = asyncio.create_task(_process_notification(payload, user))
-    _background_tasks.add(task)
-    task.add_done_callback(_background_tasks.discard)
+    if not notification_queue.offer(vpn_id, payload['event'], payload):
+        logging.warning(f"Notification queue is full, rejecting {payload['event']} for {vpn_id}")
+        return web.Response(status=503, headers={'Retry-After': '5'})
     return web.Response()
 
 
@@ -365,3 +386,5 @@ async def _process_notification(payload: dict, user) -> None:
         logging.warning(f"Timeout processing notification {event} for user {user.tg_id}")
     except Exception as e:
         logging.error(f"Error processing notification {event} for user {user.tg_id}: {e}", exc_info=True)
+
+notification_queue = NotificationQueue(_process_notification)
@@ -0,0 +1,303 @@
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import itertools
+import subprocess
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict
+
+from benchmark.fake_session import FakeSession
+from benchmark.stubs import ServiceStub
+
+SCENARIOS = ('start', 'back_to_profile', 'subscription_details', 'pay_kassa', 'pay_crypto', 'pay_stars')
+
+def _parse_args():
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description='Feed synthetic updates through the bot dispatcher and report throughput and latency.')
+    parser.add_argument('--users', type=int, default=200, help='distinct synthetic users')
+    parser.add_argument('--rounds', type=int, default=3, help='updates per user per scenario')
+    parser.add_argument('--concurrency', type=int, default=50, help='updates processed at the same time')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated scenarios to run')
+    parser.add_argument('--user-offset', type=int, default=900_000_000_000, help='first synthetic Telegram user id')
+    parser.add_argument('--telegram-latency', type=float, default=0.0, help='simulated Bot API latency in ms')
+    parser.add_argument('--panel-latency', type=float, default=0.0, help='simulated panel/payment API latency in ms')
+    parser.add_argument('--output', default='benchmark.json', help='where to write the JSON report')
+    parser.add_argument('--baseline', help='previous JSON report to compare against')
+    return parser.parse_args()
+
+def _prepare_environment(stub_url: str):
+    os.environ['PANEL_HOST'] = stub_url
+    os.environ['FSM_STORAGE'] = os.environ.get('BENCHMARK_FSM_STORAGE') or 'memory'
+    defaults = {
+        'BOT_TOKEN': '123456789:BENCHMARK',
+        'SHOP_NAME': 'Benchmark',
+        'SUPPORT_LINK': 'https://t.me/benchmark',
+        'EMAIL': 'benchmark@example.com',
+        'REMNAWAVE_TOKEN': 'benchmark',
+        'WEBHOOK_URL': 'http://127.0.0.1',
+        'WEBHOOK_PORT': '0',
+        'WEBHOOK_SECRET': 'benchmark',
+        'YOOKASSA_SHOPID': '1',
+        'YOOKASSA_TOKEN': 'benchmark',
+        'CRYPTO_TOKEN': 'benchmark',
+        'MERCHANT_UUID': 'benchmark',
+        'CRYPTO_PAYMENT_ENABLED': 'true',
+        'STARS_PAYMENT_ENABLED': 'true',
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+def _percentile(ordered: list, q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+def _summary(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        'p50_ms': round(_percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(_percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(_percentile(ordered, 0.99) * 1000, 3),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _histogram_total(histogram) -> int:
+    return sum(series['count'] for series in histogram.snapshot())
+
+class HandlerRecorder:
+    def __init__(self):
+        self.samples: dict = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.samples.setdefault(name, []).append(time.perf_counter() - started)
+
+class UpdateFactory:
+    def __init__(self, bot, good: str):
+        self.bot = bot
+        self.good = good
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def _user(self, tg_id: int) -> dict:
+        return {'id': tg_id, 'is_bot': False, 'first_name': f"User{tg_id % 10000}", 'language_code': 'en'}
+
+    def _message(self, tg_id: int, text: str, from_bot: bool = False) -> dict:
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': tg_id, 'type': 'private'},
+            'from': {'id': self.bot.id, 'is_bot': True, 'first_name': 'Benchmark'} if from_bot else self._user(tg_id),
+            'text': text,
+        }
+
+    def _callback(self, tg_id: int, data: str) -> dict:
+        return {
+            'id': str(next(self._update_ids)),
+            'from': self._user(tg_id),
+            'chat_instance': 'benchmark',
+            'data': data,
+            'message': self._message(tg_id, 'profile', from_bot=True),
+        }
+
+    def build(self, scenario: str, tg_id: int):
+        from aiogram.types import Update
+
+        if scenario == 'start':
+            payload = {'message': self._message(tg_id, '/start')}
+        elif scenario in ('back_to_profile', 'subscription_details'):
+            payload = {'callback_query': self._callback(tg_id, scenario)}
+        else:
+            payload = {'callback_query': self._callback(tg_id, f"{scenario}_{self.good}")}
+        return Update.model_validate({'update_id': next(self._update_ids), **payload}, context={'bot': self.bot})
+
+async def _run_scenario(name: str, dp, bot, factory: UpdateFactory, users: list, rounds: int, concurrency: int, counters: dict) -> dict:
+    import metrics
+    from utils.message_writer import user_message_writer
+
+    updates = [factory.build(name, tg_id) for _ in range(rounds) for tg_id in users]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    queries_before = counters['queries']
+    panel_before = _histogram_total(metrics.panel_latency)
+    telegram_before = sum(bot.session.calls.values())
+
+    async def feed(update):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await dp.feed_update(bot, update)
+            except Exception as e:
+                errors += 1
+                if errors <= 3:
+                    logging.warning(f"Benchmark: {name} update failed: {e}")
+            finally:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(feed(update) for update in updates))
+    await user_message_writer.flush()
+    elapsed = time.perf_counter() - started
+
+    count = len(updates)
+    return {
+        'updates': count,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'updates_per_sec': round(count / elapsed, 2) if elapsed else 0.0,
+        'latency': _summary(latencies),
+        'db_queries_per_update': round((counters['queries'] - queries_before) / count, 2),
+        'panel_calls_per_update': round((_histogram_total(metrics.panel_latency) - panel_before) / count, 2),
+        'telegram_calls_per_update': round((sum(bot.session.calls.values()) - telegram_before) / count, 2),
+    }
+
+def _compare(report: dict, baseline: dict):
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'}:")
+    for name, result in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        changes = []
+        for label, current, before in (
+            ('updates/s', result['updates_per_sec'], previous['updates_per_sec']),
+            ('p95', result['latency']['p95_ms'], previous['latency']['p95_ms']),
+            ('queries/update', result['db_queries_per_update'], previous['db_queries_per_update']),
+        ):
+            delta = (current - before) / before * 100 if before else 0.0
+            changes.append(f"{label} {before} -> {current} ({delta:+.1f}%)")
+        print(f"  {name:<22} " + ", ".join(changes))
+
+async def run(args) -> dict:
+    stub = ServiceStub(latency=args.panel_latency / 1000)
+    stub_url = await stub.start()
+    _prepare_environment(stub_url)
+
+    from aiogram import Bot, enums
+    from aiogram.client.default import DefaultBotProperties
+    from sqlalchemy import event
+
+    import main
+    import metrics
+    import glv
+    from db.methods import engine, replica_engine
+    from middlewares.metrics import TelegramRequestMetrics
+    from panel import get_panel
+    from utils import yookassa, cryptomus, goods
+    from utils.message_writer import user_message_writer
+
+    counters = {'queries': 0}
+
+    def count_query(*_):
+        counters['queries'] += 1
+
+    for db_engine in (engine, replica_engine):
+        if db_engine is not None:
+            event.listen(db_engine.sync_engine, 'before_cursor_execute', count_query)
+
+    bot = Bot(glv.config['BOT_TOKEN'], session=FakeSession(args.telegram_latency / 1000), default=DefaultBotProperties(parse_mode=enums.ParseMode.HTML))
+    bot.session.middleware(TelegramRequestMetrics())
+    glv.bot = bot
+    yookassa.API_URL = f"{stub_url}/v3"
+    cryptomus.client.base_url = stub_url
+
+    main.load_translations()
+    main.setup_routers()
+    main.setup_middlewares()
+    recorder = HandlerRecorder()
+    glv.dp.message.middleware(recorder)
+    glv.dp.callback_query.middleware(recorder)
+
+    callbacks = goods.get_callbacks()
+    if not callbacks:
+        raise SystemExit("goods.json has no goods, pay_* scenarios need at least one")
+    factory = UpdateFactory(bot, callbacks[0])
+    users = [args.user_offset + index for index in range(args.users)]
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'users': args.users,
+            'rounds': args.rounds,
+            'concurrency': args.concurrency,
+            'telegram_latency_ms': args.telegram_latency,
+            'panel_latency_ms': args.panel_latency,
+        },
+        'scenarios': {},
+        'handlers': {},
+    }
+    try:
+        for name in scenarios:
+            if name not in SCENARIOS:
+                logging.warning(f"Benchmark: unknown scenario '{name}' skipped")
+                continue
+            result = await _run_scenario(name, glv.dp, bot, factory, users, args.rounds, args.concurrency, counters)
+            report['scenarios'][name] = result
+            logging.info(
+                f"Benchmark: {name}: {result['updates_per_sec']} updates/s, p50={result['latency']['p50_ms']}ms "
+                f"p95={result['latency']['p95_ms']}ms p99={result['latency']['p99_ms']}ms, "
+                f"queries/update={result['db_queries_per_update']}, panel/update={result['panel_calls_per_update']}, errors={result['errors']}"
+            )
+    finally:
+        await user_message_writer.close()
+        await glv.storage.close()
+        await yookassa.close()
+        await cryptomus.client.close()
+        await get_panel().client.aclose()
+        await bot.session.close()
+        await engine.dispose()
+        if replica_engine is not None:
+            await replica_engine.dispose()
+        await stub.close()
+
+    for name, samples in sorted(recorder.samples.items()):
+        report['handlers'][name] = {'count': len(samples), **_summary(samples)}
+    report['metrics'] = {
+        'db_calls': _histogram_total(metrics.db_latency),
+        'panel_calls': _histogram_total(metrics.panel_latency),
+        'telegram_calls': dict(bot.session.calls),
+    }
+    return report
+
+def main():
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout, format="%(asctime)s %(levelname)s %(message)s")
+    args = _parse_args()
+    report = asyncio.run(run(args))
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"Benchmark: report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            _compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
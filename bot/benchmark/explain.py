@@ -0,0 +1,159 @@
+import os
+import sys
+import asyncio
+import logging
+import hashlib
+from datetime import datetime, timedelta
+
+PROBE_TG_ID = 900_000_000_000
+PROBE_PREFIX = 'explain-probe'
+SEED_ROWS = 5000
+HOT_TABLES = ('vpnusers', 'payments', 'user_promo_codes', 'promo_codes', 'user_messages', 'traffic_notifications', 'referral_bonuses', 'payment_inbox')
+
+async def _run_hot_queries():
+    import db.methods as methods
+
+    tg_id = PROBE_TG_ID + SEED_ROWS // 2
+    vpn_id = hashlib.md5(str(tg_id).encode()).hexdigest()
+    await methods.get_vpn_user(tg_id)
+    await methods.get_marzban_profile_by_vpn_id(vpn_id)
+    await methods.get_marzban_profiles_by_vpn_ids([vpn_id, PROBE_PREFIX])
+    await methods.get_vpn_user_by_vpn_id(vpn_id)
+    await methods.get_payment(f"{PROBE_PREFIX}-{SEED_ROWS // 2}", methods.PaymentPlatform.YOOKASSA)
+    await methods.get_pending_telegram_payment(tg_id, PROBE_PREFIX)
+    await methods.get_confirmed_payment_callbacks(tg_id)
+    await methods.has_confirmed_payments(tg_id)
+    await methods.has_activated_promo_code(tg_id, 1)
+    await methods.get_user_promo_discount(tg_id)
+    await methods.get_user_messages(tg_id)
+    await methods.get_last_traffic_notification(tg_id, PROBE_PREFIX)
+    await methods.get_recently_notified_users([tg_id, tg_id + 1], PROBE_PREFIX, datetime.now() - timedelta(days=1))
+    await methods.get_pending_payment_inbox_events()
+    await methods.get_unreconciled_payments_page(
+        [methods.PaymentPlatform.YOOKASSA], datetime.now() - timedelta(days=1), datetime.now()
+    )
+
+def _seed_rows(rows: int) -> dict:
+    now = datetime.now()
+    tg_ids = [PROBE_TG_ID + i for i in range(rows)]
+    return {
+        'vpnusers': [
+            {'tg_id': tg_id, 'vpn_id': hashlib.md5(str(tg_id).encode()).hexdigest(), 'referred_by_id': None}
+            for tg_id in tg_ids
+        ],
+        'payments': [
+            {
+                'tg_id': tg_id, 'lang': 'en', 'payment_id': f"{PROBE_PREFIX}-{i}", 'callback': PROBE_PREFIX,
+                'type': i % 3, 'created_at': now - timedelta(days=i % 90), 'confirmed': i % 4 != 0,
+            }
+            for i, tg_id in enumerate(tg_ids)
+        ],
+        'user_promo_codes': [
+            {'tg_id': tg_id, 'promo_code_id': i % 50 + 1, 'activated_at': now, 'used': i % 2 == 0}
+            for i, tg_id in enumerate(tg_ids)
+        ],
+        'user_messages': [
+            {'tg_id': tg_id, 'message_id': i, 'message_type': ('navigation', 'profile', 'payment')[i % 3], 'created_at': now - timedelta(minutes=i)}
+            for i, tg_id in enumerate(tg_ids)
+        ],
+        'traffic_notifications': [
+            {'tg_id': tg_id, 'notification_type': PROBE_PREFIX, 'sent_at': now - timedelta(hours=i % 72)}
+            for i, tg_id in enumerate(tg_ids)
+        ],
+        'referral_bonuses': [
+            {
+                'inviter_id': tg_id, 'referee_id': tg_ids[-1 - i], 'payment_id': i,
+                'bonus_days_inviter': 7, 'bonus_days_referee': 3, 'purchase_days': 30, 'created_at': now,
+            }
+            for i, tg_id in enumerate(tg_ids)
+        ],
+        'payment_inbox': [
+            {
+                'provider': i % 2, 'payment_id': f"{PROBE_PREFIX}-{i}", 'tg_id': tg_id, 'event': 'paid',
+                'status': 'done', 'attempts': 1, 'created_at': now,
+            }
+            for i, tg_id in enumerate(tg_ids)
+        ],
+    }
+
+async def _remove_seed(conn):
+    from sqlalchemy import delete
+    from db.models import VPNUsers, Payments, UserPromoCode, UserMessages, TrafficNotification, ReferralBonus, PaymentInbox
+
+    probe_range = (PROBE_TG_ID, PROBE_TG_ID + SEED_ROWS * 10)
+    await conn.execute(delete(PaymentInbox).where(PaymentInbox.payment_id.like(f"{PROBE_PREFIX}%")))
+    await conn.execute(delete(ReferralBonus).where(ReferralBonus.inviter_id.between(*probe_range)))
+    for model in (Payments, UserPromoCode, UserMessages, TrafficNotification, VPNUsers):
+        await conn.execute(delete(model).where(model.tg_id.between(*probe_range)))
+
+async def _seed(engine, rows: int):
+    from sqlalchemy import insert, text
+    from db.base import Base
+
+    async with engine.begin() as conn:
+        await _remove_seed(conn)
+        for table, values in _seed_rows(rows).items():
+            await conn.execute(insert(Base.metadata.tables[table]), values)
+        await conn.execute(text(f"ANALYZE TABLE {', '.join(HOT_TABLES)}"))
+
+async def check(seed_rows: int = SEED_ROWS) -> list:
+    from sqlalchemy import event
+    from db.methods import engine, replica_engine
+
+    if seed_rows:
+        await _seed(engine, seed_rows)
+
+    engines = [e.sync_engine for e in (engine, replica_engine) if e is not None]
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and ' FROM ' in statement.upper():
+            captured.append((statement, parameters))
+
+    for sync_engine in engines:
+        event.listen(sync_engine, 'before_cursor_execute', capture)
+    try:
+        await _run_hot_queries()
+    finally:
+        for sync_engine in engines:
+            event.remove(sync_engine, 'before_cursor_execute', capture)
+
+    failures = []
+    try:
+        async with engine.connect() as conn:
+            for statement, parameters in captured:
+                plan = (await conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)).mappings().fetchall()
+                for row in plan:
+                    if row['type'] == 'ALL' and row['table'] in HOT_TABLES:
+                        failures.append((statement, row))
+    finally:
+        if seed_rows:
+            async with engine.begin() as conn:
+                await _remove_seed(conn)
+
+    logging.info(f"EXPLAIN check: {len(captured)} hot quer(ies) inspected, {len(failures)} full scan(s)")
+    return failures
+
+def describe(statement: str, row) -> str:
+    return f"Full scan of `{row['table']}` (possible keys: {row['possible_keys'] or 'none'}):\n{' '.join(statement.split())}"
+
+async def _main() -> list:
+    from db.methods import engine, replica_engine
+
+    try:
+        return await check()
+    finally:
+        await engine.dispose()
+        if replica_engine is not None:
+            await replica_engine.dispose()
+
+def main():
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout, format="%(asctime)s %(levelname)s %(message)s")
+    os.environ.setdefault('WEBHOOK_PORT', '0')
+    failures = asyncio.run(_main())
+    for statement, row in failures:
+        logging.error(describe(statement, row))
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import asyncio
+import itertools
+import typing
+from collections import Counter
+from datetime import datetime
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod, GetMe, GetChatMember
+from aiogram.methods.base import TelegramType
+from aiogram.types import Chat, ChatMemberMember, Message, User
+
+class FakeSession(BaseSession):
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = itertools.count(1_000_000)
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url: str, headers: dict = None, timeout: int = 30, chunk_size: int = 65536, raise_for_status: bool = True):
+        yield b""
+
+    def _message(self, method: TelegramMethod) -> Message:
+        chat_id = getattr(method, 'chat_id', None)
+        return Message(
+            message_id=next(self._message_ids),
+            date=datetime.now(),
+            chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type='private'),
+            text=getattr(method, 'text', None)
+        )
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[TelegramType], timeout: int = None) -> TelegramType:
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if isinstance(method, GetMe):
+            return User(id=bot.id, is_bot=True, first_name='Benchmark', username='benchmark_bot')
+        if isinstance(method, GetChatMember):
+            return ChatMemberMember(user=User(id=method.user_id, is_bot=False, first_name='User', language_code='en'))
+
+        returning = method.__returning__
+        if typing.get_origin(returning) is list:
+            return [self._message(method)] if Message in typing.get_args(returning) else []
+        options = typing.get_args(returning) or (returning,)
+        if Message in options:
+            return self._message(method)
+        if bool in options:
+            return True
+        return None
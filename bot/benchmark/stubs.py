@@ -0,0 +1,136 @@
+import asyncio
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, UTC
+
+from aiohttp import web
+from aiohttp.web_request import Request
+
+class ServiceStub:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.users: dict = {}
+        self.by_telegram_id: dict = {}
+        self.squad_uuid = str(uuid.uuid4())
+        self.cryptomus_payments: dict = {}
+        self.requests: deque = deque(maxlen=1000)
+        self._failures: dict = {}
+        self._runner: web.AppRunner = None
+        self.url = None
+
+        app = web.Application(middlewares=[self._delay])
+        app.router.add_get('/api/users/by-username/{username}', self.get_user_by_username)
+        app.router.add_get('/api/users/by-telegram-id/{tg_id}', self.get_user_by_telegram_id)
+        app.router.add_get('/api/users/{uuid}/subscription', self.get_subscription)
+        app.router.add_get('/api/users', self.list_users)
+        app.router.add_post('/api/users', self.save_user)
+        app.router.add_patch('/api/users', self.save_user)
+        app.router.add_get('/api/internal-squads', self.list_squads)
+        app.router.add_post('/v3/payments', self.create_yookassa_payment)
+        app.router.add_post('/v1/payment', self.create_cryptomus_payment)
+        app.router.add_post('/v1/payment/info', self.get_cryptomus_payment)
+        app.router.add_route('*', '/{tail:.*}', self.fallback)
+        self.app = app
+
+    def fail(self, path: str, times: int, status: int = 502):
+        self._failures[path] = (times, status)
+
+    @web.middleware
+    async def _delay(self, request: Request, handler):
+        self.requests.append((request.method, request.path, dict(request.headers), await request.read()))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        times, status = self._failures.get(request.path, (0, None))
+        if times > 0:
+            self._failures[request.path] = (times - 1, status)
+            return web.json_response({'state': 1, 'message': 'stub failure'}, status=status)
+        return await handler(request)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _user(self, username: str) -> dict:
+        user = self.users.get(username)
+        if user is None:
+            user_uuid = str(uuid.uuid4())
+            user = self.users[username] = {
+                'uuid': user_uuid,
+                'username': username,
+                'status': 'ACTIVE',
+                'subscriptionUrl': f"{self.url}/sub/{user_uuid}",
+                'usedTrafficBytes': 1024 ** 3,
+                'trafficLimitBytes': 100 * 1024 ** 3,
+                'expireAt': (datetime.now(UTC) + timedelta(days=30)).isoformat().replace('+00:00', 'Z'),
+                'telegramId': None,
+            }
+        return user
+
+    async def get_user_by_username(self, request: Request):
+        return web.json_response({'response': self._user(request.match_info['username'])})
+
+    async def get_user_by_telegram_id(self, request: Request):
+        user = self.by_telegram_id.get(int(request.match_info['tg_id']))
+        return web.json_response({'response': {'root': [user] if user else []}})
+
+    async def get_subscription(self, request: Request):
+        return web.json_response({'response': {'url': f"{self.url}/sub/{request.match_info['uuid']}"}})
+
+    async def list_users(self, request: Request):
+        username = request.query.get('username')
+        users = [self._user(username)] if username else list(self.users.values())
+        return web.json_response({'response': {'users': users, 'total': len(users)}})
+
+    async def save_user(self, request: Request):
+        payload = await request.json()
+        user = next((user for user in self.users.values() if user['uuid'] == payload.get('uuid')), None)
+        if user is None:
+            user = self._user(payload.get('username') or str(uuid.uuid4()))
+        user.update({key: value for key, value in payload.items() if key != 'uuid'})
+        if user.get('telegramId'):
+            self.by_telegram_id[int(user['telegramId'])] = user
+        return web.json_response({'response': user})
+
+    async def list_squads(self, request: Request):
+        return web.json_response({'response': {'internalSquads': [{'uuid': self.squad_uuid, 'name': 'Default-Squad', 'users': []}]}})
+
+    async def create_yookassa_payment(self, request: Request):
+        payload = await request.json()
+        payment_id = str(uuid.uuid4())
+        return web.json_response({
+            'id': payment_id,
+            'status': 'pending',
+            'amount': payload['amount'],
+            'confirmation': {'type': 'redirect', 'confirmation_url': f"{self.url}/pay/{payment_id}"},
+        })
+
+    async def create_cryptomus_payment(self, request: Request):
+        payload = await request.json()
+        self.cryptomus_payments[payload['order_id']] = 'check'
+        return web.json_response({'state': 0, 'result': {
+            'uuid': str(uuid.uuid4()),
+            'order_id': payload['order_id'],
+            'amount': payload['amount'],
+            'url': f"{self.url}/pay/{payload['order_id']}",
+            'payment_status': 'check',
+        }})
+
+    async def get_cryptomus_payment(self, request: Request):
+        payload = await request.json()
+        status = self.cryptomus_payments.get(payload['order_id'])
+        if status is None:
+            return web.json_response({'state': 1, 'message': 'Payment not found'}, status=404)
+        return web.json_response({'state': 0, 'result': {'order_id': payload['order_id'], 'payment_status': status}})
+
+    async def fallback(self, request: Request):
+        return web.json_response({'response': {}})
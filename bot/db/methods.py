@@ -1,13 +1,22 @@
+import time
+import logging
 import hashlib
 from enum import Enum
 from datetime import datetime, timedelta
 import asyncio
-
-from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy import insert, select, update, delete, exists
-from sqlalchemy.exc import OperationalError, IntegrityError
-
-from db.models import VPNUsers, Payments, PromoCode, UserPromoCode, UserMessages, TrafficNotification, ReferralBonus
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncConnection
+from sqlalchemy import insert, select, update, delete, exists, func, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.exc import OperationalError
+
+from db.models import VPNUsers, Payments, PromoCode, UserPromoCode, UserMessages, TrafficNotification, ReferralBonus, BroadcastJob, BroadcastDelivery, FSMRecord, PaymentInbox
+from db.user_context import get_current_user_id, get_cached_user, set_cached_user, get_cached_value, set_cached_value, invalidate_user_context
+import metrics
+import resilience
 import glv
 
 class PaymentPlatform(Enum):
@@ -15,8 +24,7 @@ class PaymentPlatform(Enum):
     CRYPTOMUS = 1
     TELEGRAM = 2
 
-engine = create_async_engine(
-    glv.config['DB_URL'],
+ENGINE_OPTIONS = dict(
     pool_pre_ping=True,
     pool_recycle=3600,
     pool_size=10,
@@ -25,91 +33,225 @@ engine = create_async_engine(
     connect_args={"connect_timeout": 30}
 )
 
-async def _retry_on_connection_error(func, max_retries=3, delay=0.5):
-    for attempt in range(max_retries):
-        try:
-            return await func()
-        except OperationalError:
-            if attempt == max_retries - 1:
-                raise
-            await asyncio.sleep(delay * (attempt + 1))
-
-async def create_vpn_user(tg_id: int):
-    async def _execute():
-        async with engine.connect() as conn:
-            sql_query = select(VPNUsers).where(VPNUsers.tg_id == tg_id)
-            result: VPNUsers = (await conn.execute(sql_query)).fetchone()
-            if result is not None:
-                return
-        async with engine.begin() as conn:
-            vpn_hash = hashlib.md5(str(tg_id).encode()).hexdigest()
-            sql_query = insert(VPNUsers).values(tg_id=tg_id, vpn_id=vpn_hash, test=None)
-            await conn.execute(sql_query)
+engine = create_async_engine(glv.config['DB_URL'], **ENGINE_OPTIONS)
+replica_engine = create_async_engine(glv.config['DB_REPLICA_URL'], **ENGINE_OPTIONS) if glv.config['DB_REPLICA_URL'] else None
+
+_unit_of_work: ContextVar[Optional[tuple]] = ContextVar('unit_of_work', default=None)
+_last_write: ContextVar[float] = ContextVar('last_write', default=0.0)
+_recent_writers: dict = {}
+RECENT_WRITERS_LIMIT = 10000
 
+def _joined_connection() -> Optional[AsyncConnection]:
+    current = _unit_of_work.get()
+    if current is None or current[1] is not asyncio.current_task():
+        return None
+    return current[0]
+
+def _mark_write():
+    if replica_engine is None:
+        return
+    now = time.monotonic()
+    _last_write.set(now)
+    tg_id = get_current_user_id()
+    if tg_id is None:
+        return
+    _recent_writers[tg_id] = now
+    if len(_recent_writers) > RECENT_WRITERS_LIMIT:
+        expired = now - glv.config['DB_REPLICA_STICKY']
+        for key in [key for key, wrote_at in _recent_writers.items() if wrote_at < expired]:
+            del _recent_writers[key]
+
+def _replica_allowed() -> bool:
+    if replica_engine is None or _joined_connection() is not None:
+        return False
+    expired = time.monotonic() - glv.config['DB_REPLICA_STICKY']
+    if _last_write.get() >= expired:
+        return False
+    tg_id = get_current_user_id()
+    return tg_id is None or _recent_writers.get(tg_id, 0.0) < expired
+
+@asynccontextmanager
+async def unit_of_work():
+    conn = _joined_connection()
+    if conn is not None:
+        yield conn
+        return
+    try:
+        async with engine.begin() as conn:
+            token = _unit_of_work.set((conn, asyncio.current_task()))
+            try:
+                yield conn
+            finally:
+                _unit_of_work.reset(token)
+    finally:
+        _mark_write()
+
+@asynccontextmanager
+async def _connect():
+    conn = _joined_connection()
+    if conn is not None:
+        yield conn
+        return
+    async with engine.connect() as conn:
+        yield conn
+
+@asynccontextmanager
+async def _begin():
+    conn = _joined_connection()
+    if conn is not None:
+        yield conn
+        return
     try:
-        await _retry_on_connection_error(_execute)
-    except IntegrityError:
-        pass
+        async with engine.begin() as conn:
+            yield conn
+    finally:
+        _mark_write()
+
+@asynccontextmanager
+async def read_replica():
+    conn = None
+    if _replica_allowed():
+        try:
+            conn = await replica_engine.connect()
+        except OperationalError as e:
+            logging.warning(f"DB replica unavailable, reading from primary: {e}")
+    if conn is None:
+        metrics.db_reads.inc(target='primary')
+        async with _connect() as conn:
+            yield conn
+        return
+    metrics.db_reads.inc(target='replica')
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+db_breaker = resilience.CircuitBreaker(
+    'db',
+    failure_threshold=glv.config['DB_BREAKER_THRESHOLD'],
+    reset_timeout=glv.config['DB_BREAKER_RESET']
+)
+db_retry = resilience.RetryPolicy(attempts=3, base_delay=0.25, retry_on=(OperationalError,))
+
+def _db_call(retry: resilience.RetryPolicy = None):
+    def decorator(func):
+        guarded = resilience.guarded(
+            func,
+            db_breaker,
+            failures=(OperationalError,),
+            retry=retry,
+            should_retry=lambda: _joined_connection() is None
+        )
+        return metrics.timed(guarded, metrics.db_latency, function=func.__name__)
+    return decorator
+
+async def _create_vpn_user(tg_id: int) -> VPNUsers:
+    cached = get_cached_user(tg_id)
+    if cached is not None:
+        return cached
+
+    async with _begin() as conn:
+        vpn_hash = hashlib.md5(str(tg_id).encode()).hexdigest()
+        sql_query = mysql_insert(VPNUsers).values(tg_id=tg_id, vpn_id=vpn_hash, test=None).prefix_with('IGNORE')
+        await conn.execute(sql_query)
+        sql_query = select(VPNUsers).where(VPNUsers.tg_id == tg_id)
+        result: VPNUsers = (await conn.execute(sql_query)).fetchone()
+    set_cached_user(tg_id, result)
+    return result
+
+async def _get_vpn_user(tg_id: int) -> VPNUsers:
+    cached = get_cached_user(tg_id)
+    if cached is not None:
+        return cached
 
+    async with read_replica() as conn:
+        sql_query = select(VPNUsers).where(VPNUsers.tg_id == tg_id)
+        result: VPNUsers = (await conn.execute(sql_query)).fetchone()
+    set_cached_user(tg_id, result)
+    return result
+
+@_db_call(retry=db_retry)
+async def create_vpn_user(tg_id: int) -> VPNUsers:
+    return await _create_vpn_user(tg_id)
+
+@_db_call(retry=db_retry)
 async def get_vpn_user(tg_id: int) -> VPNUsers:
-    async def _execute():
-        async with engine.connect() as conn:
-            sql_query = select(VPNUsers).where(VPNUsers.tg_id == tg_id)
-            result: VPNUsers = (await conn.execute(sql_query)).fetchone()
-        return result
-    
-    return await _retry_on_connection_error(_execute)
+    return await _get_vpn_user(tg_id)
 
+@_db_call(retry=db_retry)
+async def get_or_create_vpn_user(tg_id: int) -> VPNUsers:
+    user = await _get_vpn_user(tg_id)
+    if user is not None:
+        return user
+    return await _create_vpn_user(tg_id)
+
+@_db_call(retry=db_retry)
 async def get_marzban_profile_by_vpn_id(vpn_id: str):
-    async with engine.connect() as conn:
+    async with read_replica() as conn:
         sql_query = select(VPNUsers).where(VPNUsers.vpn_id == vpn_id)
         result: VPNUsers = (await conn.execute(sql_query)).fetchone()
     return result
 
+@_db_call(retry=db_retry)
+async def get_marzban_profiles_by_vpn_ids(vpn_ids: list) -> dict:
+    if not vpn_ids:
+        return {}
+    async with read_replica() as conn:
+        sql_query = select(VPNUsers).where(VPNUsers.vpn_id.in_(vpn_ids))
+        rows = (await conn.execute(sql_query)).fetchall()
+    return {row.vpn_id: row for row in rows}
+
+@_db_call()
 async def update_vpn_id(tg_id: int, vpn_id: str):
-    async with engine.begin() as conn:
+    async with _begin() as conn:
         sql_q = update(VPNUsers).where(VPNUsers.tg_id == tg_id).values(vpn_id=vpn_id)
         await conn.execute(sql_q)
+    invalidate_user_context(tg_id)
 
+@_db_call(retry=db_retry)
 async def get_vpn_user_by_vpn_id(vpn_id: str) -> VPNUsers:
-    async with engine.connect() as conn:
+    async with read_replica() as conn:
         sql_query = select(VPNUsers).where(VPNUsers.vpn_id == vpn_id)
         result: VPNUsers = (await conn.execute(sql_query)).fetchone()
     return result
 
+@_db_call(retry=db_retry)
 async def is_trial_available(tg_id: int) -> bool:
-    async with engine.connect() as conn:
-        sql_query = select(VPNUsers).where(VPNUsers.tg_id == tg_id)
-        result: VPNUsers = (await conn.execute(sql_query)).fetchone()
+    result = await _get_vpn_user(tg_id)
     if result is None:
         return True
     return result.test is None
 
+@_db_call()
 async def start_trial(tg_id):
-    async with engine.begin() as conn:
+    async with _begin() as conn:
         sql_q = update(VPNUsers).where(VPNUsers.tg_id == tg_id).values(test=True)
         await conn.execute(sql_q)
+    invalidate_user_context(tg_id)
 
+@_db_call()
 async def disable_trial(tg_id):
-    async with engine.begin() as conn:
+    async with _begin() as conn:
         sql_q = update(VPNUsers).where(VPNUsers.tg_id == tg_id).values(test=False)
         await conn.execute(sql_q)
+    invalidate_user_context(tg_id)
 
+@_db_call(retry=db_retry)
 async def is_test_subscription(tg_id: int) -> bool:
-    async with engine.connect() as conn:
-        sql_query = select(VPNUsers).where(VPNUsers.tg_id == tg_id)
-        result: VPNUsers = (await conn.execute(sql_query)).fetchone()
+    result = await _get_vpn_user(tg_id)
     if result is None:
         return False
     return result.test
 
+@_db_call()
 async def add_payment(tg_id: int, callback: str, lang_code: str, payment_id:str, platform:PaymentPlatform, confirmed: bool = False, message_id: int = None, from_notification: bool = False) -> dict:
-    async with engine.begin() as conn:
+    async with _begin() as conn:
         sql_q = insert(Payments).values(tg_id=tg_id, payment_id=payment_id, callback=callback, lang=lang_code, type=platform.value, confirmed=confirmed, created_at=datetime.now(), message_id=message_id, from_notification=from_notification)
         await conn.execute(sql_q)
 
+@_db_call(retry=db_retry)
 async def get_payment(payment_id, platform:PaymentPlatform) -> Payments:
-    async with engine.connect() as conn:
+    async with _connect() as conn:
         sql_q = select(Payments).where(
             Payments.payment_id == payment_id,
             Payments.type == platform.value
@@ -117,8 +259,9 @@ async def get_payment(payment_id, platform:PaymentPlatform) -> Payments:
         payment: Payments = (await conn.execute(sql_q)).fetchone()
     return payment
 
+@_db_call(retry=db_retry)
 async def get_pending_telegram_payment(tg_id: int, callback: str) -> Payments:
-    async with engine.connect() as conn:
+    async with _connect() as conn:
         sql_q = (
             select(Payments)
             .where(
@@ -132,35 +275,46 @@ async def get_pending_telegram_payment(tg_id: int, callback: str) -> Payments:
         payment: Payments = (await conn.execute(sql_q)).fetchone()
     return payment
 
+@_db_call()
 async def confirm_payment(payment_id):
-    async with engine.begin() as conn:
+    async with _begin() as conn:
         sql_q = update(Payments).where(Payments.payment_id == payment_id).values(confirmed=True)
         await conn.execute(sql_q)
 
+@_db_call()
 async def delete_payment(payment_id):
-    async with engine.begin() as conn:
+    async with _begin() as conn:
         sql_q = delete(Payments).where(Payments.payment_id == payment_id)
         await conn.execute(sql_q)
 
+@_db_call(retry=db_retry)
 async def get_promo_code_by_code(code: str) -> PromoCode:
-    async with engine.connect() as conn:
+    async with read_replica() as conn:
         sql_query = select(PromoCode).where(PromoCode.code == code.upper())
         result: PromoCode = (await conn.execute(sql_query)).fetchone()
     return result
 
+@_db_call(retry=db_retry)
 async def has_activated_promo_code(tg_id: int, promo_code_id: int) -> bool:
-    async with engine.connect() as conn:
+    async with _connect() as conn:
         sql_query = select(UserPromoCode).where(UserPromoCode.tg_id == tg_id, UserPromoCode.promo_code_id == promo_code_id)
         result = (await conn.execute(sql_query)).fetchone()
     return result is not None
 
+@_db_call()
 async def activate_promo_code(tg_id: int, promo_code_id: int):
-    async with engine.begin() as conn:
+    async with _begin() as conn:
         sql_query = insert(UserPromoCode).values(tg_id=tg_id, promo_code_id=promo_code_id, activated_at=datetime.now())
         await conn.execute(sql_query)
+    invalidate_user_context(tg_id)
 
+@_db_call(retry=db_retry)
 async def get_user_promo_discount(tg_id: int) -> float:
-    async with engine.connect() as conn:
+    cached = get_cached_value(tg_id, 'promo_discount')
+    if cached is not None:
+        return cached
+
+    async with read_replica() as conn:
         sql_query = select(PromoCode.discount_percent).join(
             UserPromoCode, PromoCode.id == UserPromoCode.promo_code_id
         ).where(
@@ -169,10 +323,13 @@ async def get_user_promo_discount(tg_id: int) -> float:
             PromoCode.expires_at > datetime.now()
         )
         result = (await conn.execute(sql_query)).fetchone()
-    return result[0] if result else 0.0
+    discount = result[0] if result else 0.0
+    set_cached_value(tg_id, 'promo_discount', discount)
+    return discount
 
+@_db_call(retry=db_retry)
 async def get_confirmed_payment_callbacks(tg_id: int) -> list:
-    async with engine.connect() as conn:
+    async with read_replica() as conn:
         sql_query = select(Payments.callback).where(
             Payments.tg_id == tg_id,
             Payments.confirmed == True
@@ -180,8 +337,9 @@ async def get_confirmed_payment_callbacks(tg_id: int) -> list:
         rows = (await conn.execute(sql_query)).fetchall()
     return [row[0] for row in rows]
 
+@_db_call(retry=db_retry)
 async def has_confirmed_payments(tg_id: int) -> bool:
-    async with engine.connect() as conn:
+    async with read_replica() as conn:
         sql_query = select(exists().where(
             Payments.tg_id == tg_id, 
             Payments.confirmed == True
@@ -189,27 +347,48 @@ async def has_confirmed_payments(tg_id: int) -> bool:
         result = (await conn.execute(sql_query)).scalar()
     return result
 
+@_db_call()
 async def use_all_promo_codes(tg_id: int):
-    async with engine.begin() as conn:
+    async with _begin() as conn:
         sql_query = update(UserPromoCode).where(UserPromoCode.tg_id == tg_id).values(used=True)
         await conn.execute(sql_query)
+    invalidate_user_context(tg_id)
 
+@_db_call(retry=db_retry)
 async def get_vpn_users():
-    async with engine.connect() as conn:
+    async with read_replica() as conn:
         sql_query = select(VPNUsers)
         result: list[VPNUsers] = (await conn.execute(sql_query)).fetchall()
     return result
 
+@_db_call(retry=db_retry)
+async def get_vpn_user_ids_page(after_id: int = 0, limit: int = 1000) -> list:
+    async with read_replica() as conn:
+        sql_query = select(VPNUsers.id, VPNUsers.tg_id).where(
+            VPNUsers.id > after_id
+        ).order_by(VPNUsers.id.asc()).limit(limit)
+        result = (await conn.execute(sql_query)).fetchall()
+    return result
+
+@_db_call(retry=db_retry)
+async def count_vpn_users() -> int:
+    async with read_replica() as conn:
+        sql_query = select(func.count()).select_from(VPNUsers)
+        result = (await conn.execute(sql_query)).scalar()
+    return result or 0
+
+@_db_call(retry=db_retry)
 async def get_active_promo_codes():
-    async with engine.connect() as conn:
+    async with read_replica() as conn:
         sql_query = select(PromoCode).where(
             PromoCode.expires_at > datetime.now()
         ).order_by(PromoCode.created_at.desc())
         result: list[PromoCode] = (await conn.execute(sql_query)).fetchall()
     return result
 
+@_db_call()
 async def add_promo_code(code: str, discount_percent: int, expires_at: datetime = None):
-    async with engine.begin() as conn:
+    async with _begin() as conn:
         sql_query = insert(PromoCode).values(
             code=code.upper(),
             discount_percent=discount_percent,
@@ -218,19 +397,22 @@ async def add_promo_code(code: str, discount_percent: int, expires_at: datetime
         )
         await conn.execute(sql_query)
 
+@_db_call()
 async def delete_promo_code(promo_code_id: int):
-    async with engine.begin() as conn:
+    async with _begin() as conn:
         sql_query = delete(PromoCode).where(PromoCode.id == promo_code_id)
         await conn.execute(sql_query)
 
+@_db_call(retry=db_retry)
 async def get_promo_code_by_id(promo_code_id: int) -> PromoCode:
-    async with engine.connect() as conn:
+    async with read_replica() as conn:
         sql_query = select(PromoCode).where(PromoCode.id == promo_code_id)
         result: PromoCode = (await conn.execute(sql_query)).fetchone()
     return result
 
+@_db_call()
 async def save_user_message(tg_id: int, message_id: int, message_type: str):
-    async with engine.connect() as conn:
+    async with _connect() as conn:
         check_query = select(UserMessages).where(
             UserMessages.tg_id == tg_id,
             UserMessages.message_id == message_id,
@@ -239,7 +421,7 @@ async def save_user_message(tg_id: int, message_id: int, message_type: str):
         existing = (await conn.execute(check_query)).fetchone()
     
     if not existing:
-        async with engine.begin() as conn:
+        async with _begin() as conn:
             sql_query = insert(UserMessages).values(
                 tg_id=tg_id,
                 message_id=message_id,
@@ -248,40 +430,53 @@ async def save_user_message(tg_id: int, message_id: int, message_type: str):
             )
             await conn.execute(sql_query)
 
-async def get_user_messages(tg_id: int) -> dict:
-    async with engine.connect() as conn:
-        sql_query = select(UserMessages).where(
-            UserMessages.tg_id == tg_id
-        ).order_by(UserMessages.created_at.asc())
+MULTI_SLOT_MESSAGE_TYPES = ('navigation', 'notification')
+
+@_db_call(retry=db_retry)
+async def get_user_messages(tg_id: int, limit: int = 200) -> dict:
+    async with _connect() as conn:
+        ranked = select(
+            UserMessages.message_type,
+            UserMessages.message_id,
+            UserMessages.created_at,
+            UserMessages.id,
+            func.row_number().over(
+                partition_by=UserMessages.message_type,
+                order_by=(UserMessages.created_at.desc(), UserMessages.id.desc())
+            ).label('newest'),
+            func.row_number().over(
+                partition_by=UserMessages.message_type,
+                order_by=(UserMessages.created_at, UserMessages.id)
+            ).label('oldest')
+        ).where(UserMessages.tg_id == tg_id).subquery()
+        sql_query = select(ranked.c.message_type, ranked.c.message_id).where(
+            (ranked.c.message_type.in_(MULTI_SLOT_MESSAGE_TYPES) & (ranked.c.newest <= limit))
+            | (ranked.c.message_type.not_in(MULTI_SLOT_MESSAGE_TYPES) & (ranked.c.oldest == 1))
+        ).order_by(ranked.c.created_at.desc(), ranked.c.id.desc())
         results = (await conn.execute(sql_query)).fetchall()
     
     messages = {
-        'navigation': [],
+        'navigation': {},
         'profile': None,
         'payment': None,
-        'notification': [],
+        'notification': {},
         'success': None,
         'important': None
     }
     
-    seen_single = set()
-    
-    for row in results:
-        msg_type = row.message_type
-        msg_id = row.message_id
-        
-        if msg_type in ['navigation', 'notification']:
-            if msg_id not in messages[msg_type]:
-                messages[msg_type].append(msg_id)
-        else:
-            if msg_type not in seen_single:
-                messages[msg_type] = msg_id
-                seen_single.add(msg_type)
+    for msg_type, msg_id in reversed(results):
+        if msg_type in MULTI_SLOT_MESSAGE_TYPES:
+            messages[msg_type][msg_id] = None
+        elif messages.get(msg_type) is None:
+            messages[msg_type] = msg_id
     
+    messages['navigation'] = list(messages['navigation'])
+    messages['notification'] = list(messages['notification'])
     return messages
 
+@_db_call()
 async def delete_user_message(tg_id: int, message_id: int, message_type: str):
-    async with engine.begin() as conn:
+    async with _begin() as conn:
         sql_query = delete(UserMessages).where(
             UserMessages.tg_id == tg_id,
             UserMessages.message_id == message_id,
@@ -289,27 +484,60 @@ async def delete_user_message(tg_id: int, message_id: int, message_type: str):
         )
         await conn.execute(sql_query)
 
+@_db_call()
+async def apply_user_message_changes(added: list, removed: list, chunk_size: int = 500):
+    if not added and not removed:
+        return
+    created_at = datetime.now()
+    columns = tuple_(UserMessages.tg_id, UserMessages.message_id, UserMessages.message_type)
+    async with _begin() as conn:
+        for offset in range(0, len(removed), chunk_size):
+            chunk = removed[offset:offset + chunk_size]
+            await conn.execute(delete(UserMessages).where(columns.in_(chunk)))
+        for offset in range(0, len(added), chunk_size):
+            chunk = added[offset:offset + chunk_size]
+            sql_query = select(UserMessages.tg_id, UserMessages.message_id, UserMessages.message_type).where(columns.in_(chunk))
+            existing = {tuple(row) for row in (await conn.execute(sql_query)).fetchall()}
+            rows = [
+                {'tg_id': tg_id, 'message_id': message_id, 'message_type': message_type, 'created_at': created_at}
+                for tg_id, message_id, message_type in chunk
+                if (tg_id, message_id, message_type) not in existing
+            ]
+            if rows:
+                await conn.execute(insert(UserMessages), rows)
+
+@_db_call()
 async def clear_user_messages_by_type(tg_id: int, message_types: list):
-    async with engine.begin() as conn:
+    async with _begin() as conn:
         sql_query = delete(UserMessages).where(
             UserMessages.tg_id == tg_id,
             UserMessages.message_type.in_(message_types)
         )
         await conn.execute(sql_query)
 
+@_db_call()
 async def clear_user_messages(tg_id: int):
-    async with engine.begin() as conn:
+    async with _begin() as conn:
         sql_query = delete(UserMessages).where(UserMessages.tg_id == tg_id)
         await conn.execute(sql_query)
 
-async def cleanup_old_messages(days: int = 7):
+@_db_call()
+async def cleanup_old_messages(days: int = 7, batch_size: int = 5000) -> int:
     cutoff_date = datetime.now() - timedelta(days=days)
-    async with engine.begin() as conn:
-        sql_query = delete(UserMessages).where(UserMessages.created_at < cutoff_date)
-        await conn.execute(sql_query)
-
+    deleted = 0
+    while True:
+        async with _begin() as conn:
+            sql_query = delete(UserMessages).where(
+                UserMessages.created_at < cutoff_date
+            ).with_dialect_options(mysql_limit=batch_size)
+            result = await conn.execute(sql_query)
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+
+@_db_call(retry=db_retry)
 async def get_last_traffic_notification(tg_id: int, notification_type: str):
-    async with engine.connect() as conn:
+    async with read_replica() as conn:
         sql_query = select(TrafficNotification).where(
             TrafficNotification.tg_id == tg_id,
             TrafficNotification.notification_type == notification_type
@@ -319,8 +547,9 @@ async def get_last_traffic_notification(tg_id: int, notification_type: str):
             return result
         return None
 
+@_db_call()
 async def add_traffic_notification(tg_id: int, notification_type: str):
-    async with engine.begin() as conn:
+    async with _begin() as conn:
         sql_query = insert(TrafficNotification).values(
             tg_id=tg_id,
             notification_type=notification_type,
@@ -328,14 +557,250 @@ async def add_traffic_notification(tg_id: int, notification_type: str):
         )
         await conn.execute(sql_query)
 
+@_db_call(retry=db_retry)
+async def get_recently_notified_users(tg_ids: list, notification_type: str, since: datetime, chunk_size: int = 500) -> set:
+    notified = set()
+    if not tg_ids:
+        return notified
+    async with read_replica() as conn:
+        for offset in range(0, len(tg_ids), chunk_size):
+            chunk = tg_ids[offset:offset + chunk_size]
+            sql_query = select(TrafficNotification.tg_id).where(
+                TrafficNotification.tg_id.in_(chunk),
+                TrafficNotification.notification_type == notification_type,
+                TrafficNotification.sent_at >= since
+            ).distinct()
+            notified.update(row[0] for row in (await conn.execute(sql_query)).fetchall())
+    return notified
+
+@_db_call()
+async def add_traffic_notifications(tg_ids: list, notification_type: str):
+    if not tg_ids:
+        return
+    sent_at = datetime.now()
+    async with _begin() as conn:
+        await conn.execute(
+            insert(TrafficNotification),
+            [{'tg_id': tg_id, 'notification_type': notification_type, 'sent_at': sent_at} for tg_id in tg_ids]
+        )
+
+@_db_call()
+async def save_user_messages(messages: list):
+    if not messages:
+        return
+    created_at = datetime.now()
+    async with _begin() as conn:
+        await conn.execute(
+            insert(UserMessages),
+            [
+                {'tg_id': tg_id, 'message_id': message_id, 'message_type': message_type, 'created_at': created_at}
+                for tg_id, message_id, message_type in messages
+            ]
+        )
+
+@_db_call(retry=db_retry)
 async def get_all_active_users():
-    async with engine.connect() as conn:
+    async with read_replica() as conn:
         sql_query = select(VPNUsers).where(VPNUsers.test.isnot(None))
         result: list[VPNUsers] = (await conn.execute(sql_query)).fetchall()
         return result
 
+@_db_call()
 async def cleanup_old_traffic_notifications(days: int = 30):
     cutoff_date = datetime.now() - timedelta(days=days)
-    async with engine.begin() as conn:
+    async with _begin() as conn:
         sql_query = delete(TrafficNotification).where(TrafficNotification.sent_at < cutoff_date)
-        await conn.execute(sql_query)
\ No newline at end of file
+        await conn.execute(sql_query)
+
+@_db_call()
+async def create_broadcast_job(admin_id: int, text: str, lang: str, disable_notification: bool, total: int, status_message_id: int = None) -> int:
+    now = datetime.now()
+    async with _begin() as conn:
+        sql_query = insert(BroadcastJob).values(
+            admin_id=admin_id,
+            text=text,
+            lang=lang,
+            disable_notification=disable_notification,
+            status='running',
+            cursor=0,
+            total=total,
+            sent_count=0,
+            blocked_count=0,
+            failed_count=0,
+            status_message_id=status_message_id,
+            created_at=now,
+            updated_at=now
+        )
+        result = await conn.execute(sql_query)
+    return result.inserted_primary_key[0]
+
+@_db_call(retry=db_retry)
+async def get_broadcast_job(job_id: int) -> BroadcastJob:
+    async with _connect() as conn:
+        sql_query = select(BroadcastJob).where(BroadcastJob.id == job_id)
+        result: BroadcastJob = (await conn.execute(sql_query)).fetchone()
+    return result
+
+@_db_call(retry=db_retry)
+async def get_broadcast_jobs_by_status(statuses: list) -> list:
+    async with _connect() as conn:
+        sql_query = select(BroadcastJob).where(
+            BroadcastJob.status.in_(statuses)
+        ).order_by(BroadcastJob.id.asc())
+        result: list[BroadcastJob] = (await conn.execute(sql_query)).fetchall()
+    return result
+
+@_db_call()
+async def update_broadcast_job_status(job_id: int, status: str, from_statuses: list = None) -> bool:
+    now = datetime.now()
+    values = {'status': status, 'updated_at': now}
+    if status in ('completed', 'cancelled'):
+        values['finished_at'] = now
+    async with _begin() as conn:
+        sql_query = update(BroadcastJob).where(BroadcastJob.id == job_id)
+        if from_statuses:
+            sql_query = sql_query.where(BroadcastJob.status.in_(from_statuses))
+        result = await conn.execute(sql_query.values(**values))
+    return result.rowcount > 0
+
+@_db_call()
+async def save_broadcast_progress(job_id: int, deliveries: list, cursor: int, sent_count: int, blocked_count: int, failed_count: int):
+    now = datetime.now()
+    async with _begin() as conn:
+        if deliveries:
+            await conn.execute(
+                insert(BroadcastDelivery),
+                [
+                    {'job_id': job_id, 'recipient_id': recipient_id, 'tg_id': tg_id, 'status': status, 'delivered_at': now}
+                    for recipient_id, tg_id, status in deliveries
+                ]
+            )
+        sql_query = update(BroadcastJob).where(BroadcastJob.id == job_id).values(
+            cursor=cursor,
+            sent_count=sent_count,
+            blocked_count=blocked_count,
+            failed_count=failed_count,
+            updated_at=now
+        )
+        await conn.execute(sql_query)
+
+@_db_call(retry=db_retry)
+async def get_broadcast_delivered_ids(job_id: int, after_id: int) -> set:
+    async with _connect() as conn:
+        sql_query = select(BroadcastDelivery.recipient_id).where(
+            BroadcastDelivery.job_id == job_id,
+            BroadcastDelivery.recipient_id > after_id
+        )
+        result = (await conn.execute(sql_query)).fetchall()
+    return {row[0] for row in result}
+
+@_db_call(retry=db_retry)
+async def get_fsm_record(key: str) -> FSMRecord:
+    async with _connect() as conn:
+        sql_query = select(FSMRecord.state, FSMRecord.data).where(FSMRecord.key == key)
+        result: FSMRecord = (await conn.execute(sql_query)).fetchone()
+    return result
+
+@_db_call()
+async def save_fsm_records(upserts: list, deletes: list):
+    if not upserts and not deletes:
+        return
+    updated_at = datetime.now()
+    async with _begin() as conn:
+        if upserts:
+            sql_query = mysql_insert(FSMRecord)
+            sql_query = sql_query.on_duplicate_key_update(
+                state=sql_query.inserted.state,
+                data=sql_query.inserted.data,
+                updated_at=sql_query.inserted.updated_at
+            )
+            await conn.execute(
+                sql_query,
+                [{'key': key, 'state': state, 'data': data, 'updated_at': updated_at} for key, state, data in upserts]
+            )
+        if deletes:
+            await conn.execute(delete(FSMRecord).where(FSMRecord.key.in_(deletes)))
+
+@_db_call()
+async def add_payment_inbox_event(provider: PaymentPlatform, payment_id: str, tg_id: int, event: str) -> bool:
+    async with _begin() as conn:
+        sql_query = insert(PaymentInbox).prefix_with('IGNORE').values(
+            provider=provider.value,
+            payment_id=payment_id,
+            tg_id=tg_id,
+            event=event,
+            status='pending',
+            attempts=0,
+            created_at=datetime.now()
+        )
+        result = await conn.execute(sql_query)
+        if result.rowcount > 0:
+            return True
+        sql_query = update(PaymentInbox).where(
+            PaymentInbox.provider == provider.value,
+            PaymentInbox.payment_id == payment_id,
+            PaymentInbox.status.in_(('legacy', 'failed'))
+        ).values(event=event, status='pending', attempts=0, error=None, retry_at=None, created_at=datetime.now())
+        result = await conn.execute(sql_query)
+    return result.rowcount > 0
+
+@_db_call(retry=db_retry)
+async def get_pending_payment_inbox_events(limit: int = 100) -> list:
+    async with _connect() as conn:
+        sql_query = select(PaymentInbox).where(
+            PaymentInbox.status == 'pending',
+            (PaymentInbox.retry_at.is_(None)) | (PaymentInbox.retry_at <= datetime.now())
+        ).order_by(PaymentInbox.id.asc()).limit(limit)
+        result: list[PaymentInbox] = (await conn.execute(sql_query)).fetchall()
+    return result
+
+@_db_call()
+async def claim_payment_inbox_event(event_id: int) -> bool:
+    async with _begin() as conn:
+        sql_query = update(PaymentInbox).where(
+            PaymentInbox.id == event_id,
+            PaymentInbox.status == 'pending'
+        ).values(status='processing', attempts=PaymentInbox.attempts + 1)
+        result = await conn.execute(sql_query)
+    return result.rowcount > 0
+
+@_db_call()
+async def finish_payment_inbox_event(event_id: int, status: str, error: str = None, retry_at: datetime = None):
+    async with _begin() as conn:
+        sql_query = update(PaymentInbox).where(PaymentInbox.id == event_id).values(
+            status=status,
+            error=error,
+            retry_at=retry_at,
+            processed_at=datetime.now()
+        )
+        await conn.execute(sql_query)
+
+@_db_call()
+async def requeue_interrupted_payment_inbox_events() -> int:
+    async with _begin() as conn:
+        sql_query = update(PaymentInbox).where(PaymentInbox.status == 'processing').values(
+            status='pending',
+            error='interrupted by restart',
+            retry_at=None
+        )
+        result = await conn.execute(sql_query)
+    return result.rowcount
+
+@_db_call(retry=db_retry)
+async def get_unreconciled_payments_page(platforms: list, since: datetime, until: datetime, after: tuple = None, limit: int = 200) -> list:
+    async with _connect() as conn:
+        sql_query = select(Payments).outerjoin(
+            PaymentInbox,
+            (PaymentInbox.provider == Payments.type) & (PaymentInbox.payment_id == Payments.payment_id)
+        ).where(
+            Payments.confirmed == False,
+            Payments.created_at >= since,
+            Payments.created_at < until,
+            Payments.type.in_([platform.value for platform in platforms]),
+            PaymentInbox.id.is_(None)
+        )
+        if after is not None:
+            sql_query = sql_query.where(tuple_(Payments.created_at, Payments.id) > tuple_(*after))
+        sql_query = sql_query.order_by(Payments.created_at.asc(), Payments.id.asc()).limit(limit)
+        result: list[Payments] = (await conn.execute(sql_query)).fetchall()
+    return result
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, BigInteger, String, Boolean, Integer, DateTime, Text, ForeignKey
+from sqlalchemy import Column, BigInteger, String, Boolean, Integer, DateTime, Text, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -8,16 +8,21 @@ class VPNUsers(Base):
     __tablename__ = "vpnusers"
 
     id = Column(BigInteger, primary_key=True, unique=True, autoincrement=True)
-    tg_id = Column(BigInteger)
-    vpn_id = Column(String(64), default="")
+    tg_id = Column(BigInteger, unique=True, index=True)
+    vpn_id = Column(String(64), default="", index=True)
     test = Column(Boolean, nullable=True, default=None)
     referral_code = Column(String(16), unique=True, index=True, nullable=True)
-    referred_by_id = Column(BigInteger, ForeignKey("vpnusers.tg_id"), nullable=True)
+    referred_by_id = Column(BigInteger, ForeignKey("vpnusers.tg_id"), nullable=True, index=True)
     
     referrer = relationship("VPNUsers", remote_side=[tg_id], backref="referrals", foreign_keys=[referred_by_id])
 
 class Payments(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        Index('ix_payments_confirmed_created_at', 'confirmed', 'created_at'),
+        Index('ix_payments_payment_id_type', 'payment_id', 'type'),
+        Index('ix_payments_tg_id_confirmed_created_at', 'tg_id', 'confirmed', 'created_at'),
+    )
 
     id = Column(BigInteger, primary_key=True, unique=True, autoincrement=True)
     tg_id = Column(BigInteger)
@@ -41,6 +46,9 @@ class PromoCode(Base):
     
 class UserPromoCode(Base):
     __tablename__ = "user_promo_codes"
+    __table_args__ = (
+        Index('ix_user_promo_codes_tg_id_used_promo_code_id', 'tg_id', 'used', 'promo_code_id'),
+    )
     
     id = Column(BigInteger, primary_key=True, unique=True, autoincrement=True)
     tg_id = Column(BigInteger, nullable=False) 
@@ -50,18 +58,26 @@ class UserPromoCode(Base):
 
 class UserMessages(Base):
     __tablename__ = "user_messages"
+    __table_args__ = (
+        Index('ix_user_messages_tg_id_created_at', 'tg_id', 'created_at', 'message_type', 'message_id'),
+        Index('ix_user_messages_created_at', 'created_at'),
+    )
     
     id = Column(BigInteger, primary_key=True, unique=True, autoincrement=True)
-    tg_id = Column(BigInteger, nullable=False, index=True)
+    tg_id = Column(BigInteger, nullable=False)
     message_id = Column(BigInteger, nullable=False)
     message_type = Column(String(50), nullable=False)
     created_at = Column(DateTime, nullable=False, default=datetime.now)
 
 class TrafficNotification(Base):
     __tablename__ = "traffic_notifications"
+    __table_args__ = (
+        Index('ix_traffic_notifications_tg_id_type_sent_at', 'tg_id', 'notification_type', 'sent_at'),
+        Index('ix_traffic_notifications_sent_at', 'sent_at'),
+    )
     
     id = Column(BigInteger, primary_key=True, autoincrement=True)
-    tg_id = Column(BigInteger, nullable=False, index=True)
+    tg_id = Column(BigInteger, nullable=False)
     notification_type = Column(String(50), nullable=False)
     sent_at = Column(DateTime, nullable=False, default=datetime.now)
 
@@ -69,10 +85,68 @@ class ReferralBonus(Base):
     __tablename__ = "referral_bonuses"
     
     id = Column(BigInteger, primary_key=True, autoincrement=True)
-    inviter_id = Column(BigInteger, nullable=False)
-    referee_id = Column(BigInteger, nullable=False)
-    payment_id = Column(BigInteger, nullable=True)
+    inviter_id = Column(BigInteger, nullable=False, index=True)
+    referee_id = Column(BigInteger, nullable=False, index=True)
+    payment_id = Column(BigInteger, nullable=True, index=True)
     bonus_days_inviter = Column(Integer, nullable=False)
     bonus_days_referee = Column(Integer, nullable=False)
     purchase_days = Column(Integer, nullable=False)
     created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+class BroadcastJob(Base):
+    __tablename__ = "broadcast_jobs"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    admin_id = Column(BigInteger, nullable=False)
+    text = Column(Text, nullable=False)
+    lang = Column(String(8), nullable=True)
+    disable_notification = Column(Boolean, nullable=False, default=False)
+    status = Column(String(16), nullable=False, index=True)
+    cursor = Column(BigInteger, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+    sent_count = Column(Integer, nullable=False, default=0)
+    blocked_count = Column(Integer, nullable=False, default=0)
+    failed_count = Column(Integer, nullable=False, default=0)
+    status_message_id = Column(BigInteger, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+    updated_at = Column(DateTime, nullable=False, default=datetime.now)
+    finished_at = Column(DateTime, nullable=True)
+
+class BroadcastDelivery(Base):
+    __tablename__ = "broadcast_deliveries"
+    __table_args__ = (
+        Index('ix_broadcast_deliveries_job_recipient', 'job_id', 'recipient_id', unique=True),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    job_id = Column(BigInteger, nullable=False)
+    recipient_id = Column(BigInteger, nullable=False)
+    tg_id = Column(BigInteger, nullable=False)
+    status = Column(String(16), nullable=False)
+    delivered_at = Column(DateTime, nullable=False, default=datetime.now)
+
+class FSMRecord(Base):
+    __tablename__ = "fsm_storage"
+
+    key = Column(String(255), primary_key=True)
+    state = Column(String(255), nullable=True)
+    data = Column(Text, nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=datetime.now)
+
+class PaymentInbox(Base):
+    __tablename__ = "payment_inbox"
+    __table_args__ = (
+        UniqueConstraint('provider', 'payment_id', name='uq_payment_inbox_provider_payment'),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    provider = Column(Integer, nullable=False)
+    payment_id = Column(String(64), nullable=False)
+    tg_id = Column(BigInteger, nullable=False)
+    event = Column(String(16), nullable=False)
+    status = Column(String(16), nullable=False, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+    processed_at = Column(DateTime, nullable=True)
+    retry_at = Column(DateTime, nullable=True)
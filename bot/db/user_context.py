@@ -0,0 +1,61 @@
+from contextvars import ContextVar, Token
+from typing import Any, Optional
+
+class UserContext:
+    def __init__(self, tg_id: int, user=None):
+        self.tg_id = tg_id
+        self.user = user
+        self.values: dict = {}
+        self.active = True
+
+    def invalidate(self):
+        self.user = None
+        self.values.clear()
+
+_current_user_context: ContextVar[Optional[UserContext]] = ContextVar('user_context', default=None)
+
+def open_user_context(tg_id: int, user=None) -> Token:
+    return _current_user_context.set(UserContext(tg_id, user))
+
+def close_user_context(token: Token):
+    context = _current_user_context.get()
+    if context is not None:
+        context.active = False
+    _current_user_context.reset(token)
+
+def get_user_context(tg_id: int) -> Optional[UserContext]:
+    context = _current_user_context.get()
+    if context is None or not context.active or context.tg_id != tg_id:
+        return None
+    return context
+
+def get_current_user_id() -> Optional[int]:
+    context = _current_user_context.get()
+    if context is None or not context.active:
+        return None
+    return context.tg_id
+
+def get_cached_user(tg_id: int):
+    context = get_user_context(tg_id)
+    return context.user if context is not None else None
+
+def set_cached_user(tg_id: int, user):
+    context = get_user_context(tg_id)
+    if context is not None:
+        context.user = user
+
+def get_cached_value(tg_id: int, key: str, default: Any = None) -> Any:
+    context = get_user_context(tg_id)
+    if context is None:
+        return default
+    return context.values.get(key, default)
+
+def set_cached_value(tg_id: int, key: str, value: Any):
+    context = get_user_context(tg_id)
+    if context is not None:
+        context.values[key] = value
+
+def invalidate_user_context(tg_id: int):
+    context = get_user_context(tg_id)
+    if context is not None:
+        context.invalidate()
@@ -41,6 +41,8 @@ config = {
     'TRIAL_TRAFFIC_LIMIT': int(os.environ.get('TRIAL_TRAFFIC_LIMIT', 20)) * 1024 * 1024 * 1024,
     'SUPPORT_LINK': os.environ.get('SUPPORT_LINK'),
     'DB_URL': f"mysql+asyncmy://{os.environ.get('DB_USER')}:{os.environ.get('DB_PASS')}@{os.environ.get('DB_ADDRESS')}:{os.environ.get('DB_PORT')}/{os.environ.get('DB_NAME')}",
+    'DB_REPLICA_URL': f"mysql+asyncmy://{os.environ.get('DB_USER')}:{os.environ.get('DB_PASS')}@{os.environ.get('DB_REPLICA_ADDRESS')}:{os.environ.get('DB_REPLICA_PORT') or os.environ.get('DB_PORT')}/{os.environ.get('DB_NAME')}" if os.environ.get('DB_REPLICA_ADDRESS') else None,
+    'DB_REPLICA_STICKY': float(os.environ.get('DB_REPLICA_STICKY') or 5),
     'YOOKASSA_TOKEN': os.environ.get('YOOKASSA_TOKEN'),
     'YOOKASSA_SHOPID': os.environ.get('YOOKASSA_SHOPID'),
     'EMAIL': os.environ.get('EMAIL'),
@@ -55,7 +57,38 @@ config = {
     'TG_INFO_CHANEL': os.environ.get('TG_INFO_CHANEL'),
     'STARS_PAYMENT_ENABLED': os.environ.get('STARS_PAYMENT_ENABLED', False) == 'true',
     'ADMINS': _parse_admins(os.environ.get('ADMINS', '')),
-    'VPN_NOT_WORKING_LINK': os.environ.get('VPN_NOT_WORKING_LINK')
+    'VPN_NOT_WORKING_LINK': os.environ.get('VPN_NOT_WORKING_LINK'),
+    'LOCALES_HOT_RELOAD': os.environ.get('LOCALES_HOT_RELOAD', 'false') == 'true',
+    'PANEL_CACHE_TTL': float(os.environ.get('PANEL_CACHE_TTL') or 30),
+    'PANEL_CACHE_SIZE': int(os.environ.get('PANEL_CACHE_SIZE') or 10000),
+    'PANEL_PAGE_SIZE': int(os.environ.get('PANEL_PAGE_SIZE') or 500),
+    'PANEL_PAGE_CONCURRENCY': int(os.environ.get('PANEL_PAGE_CONCURRENCY') or 4),
+    'TELEGRAM_RATE_LIMIT': float(os.environ.get('TELEGRAM_RATE_LIMIT') or 30),
+    'TRAFFIC_CHECK_WORKERS': int(os.environ.get('TRAFFIC_CHECK_WORKERS') or 8),
+    'BROADCAST_WORKERS': int(os.environ.get('BROADCAST_WORKERS') or 10),
+    'FSM_STORAGE': (os.environ.get('FSM_STORAGE') or 'memory').lower(),
+    'FSM_STORAGE_PATH': os.environ.get('FSM_STORAGE_PATH') or 'fsm_storage.sqlite3',
+    'FSM_CACHE_SIZE': int(os.environ.get('FSM_CACHE_SIZE') or 10000),
+    'FSM_FLUSH_INTERVAL': float(os.environ.get('FSM_FLUSH_INTERVAL') or 0.5),
+    'MESSAGE_FLUSH_INTERVAL': float(os.environ.get('MESSAGE_FLUSH_INTERVAL') or 0.3),
+    'MESSAGE_FLUSH_BATCH_SIZE': int(os.environ.get('MESSAGE_FLUSH_BATCH_SIZE') or 200),
+    'MESSAGE_RETENTION_DAYS': int(os.environ.get('MESSAGE_RETENTION_DAYS') or 7),
+    'PAYMENT_WORKERS': int(os.environ.get('PAYMENT_WORKERS') or 4),
+    'PAYMENT_MAX_ATTEMPTS': int(os.environ.get('PAYMENT_MAX_ATTEMPTS') or 5),
+    'CRYPTOMUS_CONCURRENCY': int(os.environ.get('CRYPTOMUS_CONCURRENCY') or 10),
+    'PAYMENT_RECONCILE_INTERVAL': int(os.environ.get('PAYMENT_RECONCILE_INTERVAL') or 10),
+    'PAYMENT_RECONCILE_MAX_AGE_HOURS': int(os.environ.get('PAYMENT_RECONCILE_MAX_AGE_HOURS') or 24),
+    'PAYMENT_RECONCILE_CONCURRENCY': int(os.environ.get('PAYMENT_RECONCILE_CONCURRENCY') or 5),
+    'NOTIFY_WORKERS': int(os.environ.get('NOTIFY_WORKERS') or 8),
+    'NOTIFY_QUEUE_SIZE': int(os.environ.get('NOTIFY_QUEUE_SIZE') or 5000),
+    'TRUSTED_PROXIES': os.environ.get('TRUSTED_PROXIES') or '127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,fc00::/7',
+    'CLIENT_IP_HEADER': os.environ.get('CLIENT_IP_HEADER', 'X-Forwarded-For').strip(),
+    'METRICS_ALLOWED_IPS': os.environ.get('METRICS_ALLOWED_IPS') or '127.0.0.0/8,::1/128',
+    'UPDATE_DEADLINE': float(os.environ.get('UPDATE_DEADLINE') or 20),
+    'DB_BREAKER_THRESHOLD': int(os.environ.get('DB_BREAKER_THRESHOLD') or 10),
+    'DB_BREAKER_RESET': float(os.environ.get('DB_BREAKER_RESET') or 15),
+    'PANEL_BREAKER_THRESHOLD': int(os.environ.get('PANEL_BREAKER_THRESHOLD') or 5),
+    'PANEL_BREAKER_RESET': float(os.environ.get('PANEL_BREAKER_RESET') or 30)
 }
 
 bot: Bot = None
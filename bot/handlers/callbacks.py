@@ -23,7 +23,6 @@ from keyboards import (
     get_admin_management_keyboard,
     get_broadcast_confirmation_keyboard,
     get_broadcast_start_keyboard,
-    get_broadcast_dismiss_keyboard,
     get_subscription_details_keyboard,
     get_upgrade_menu_keyboard,
 )
@@ -35,6 +34,7 @@ from db.methods import (
     get_confirmed_payment_callbacks,
 )
 from utils import goods, yookassa, cryptomus, MessageCleanup, MessageType, try_delete_message, safe_answer
+from utils.broadcast import start_broadcast, get_active_broadcast, pause_broadcast, resume_broadcast, cancel_broadcast
 from panel import get_panel
 from filters import IsAdminCallbackFilter
 import glv
@@ -188,11 +188,7 @@ async def callback_extend_data_limit(callback: CallbackQuery, state: FSMContext)
 
     await safe_answer(callback)
 
-    filtered_goods = [
-        good
-        for good in goods.get()
-        if good["type"] == "update"
-    ]
+    filtered_goods = goods.get_by_type("update")
     
     if filtered_goods:
         keyboard = await get_buy_menu_keyboard(
@@ -288,7 +284,7 @@ async def callback_payment_kassa(callback: CallbackQuery, state: FSMContext):
             await safe_answer(callback, _("message_error"), show_alert=True)
             return
         amount_override = goods.get_upgrade_price(current, target, "ru")
-    elif data not in goods.get_callbacks():
+    elif not goods.has_callback(data):
         await safe_answer(callback)
         return
 
@@ -333,7 +329,7 @@ async def callback_payment_stars(callback: CallbackQuery, state: FSMContext):
         if not target:
             await safe_answer(callback, _("message_error"), show_alert=True)
             return
-    elif data not in goods.get_callbacks():
+    elif not goods.has_callback(data):
         await safe_answer(callback)
         return
 
@@ -397,7 +393,7 @@ async def callback_payment_crypto(callback: CallbackQuery, state: FSMContext):
             await safe_answer(callback, _("message_error"), show_alert=True)
             return
         amount_override = goods.get_upgrade_price(current, target, "en")
-    elif data not in goods.get_callbacks():
+    elif not goods.has_callback(data):
         await safe_answer(callback)
         return
 
@@ -543,7 +539,7 @@ async def callback_help(callback: CallbackQuery, state: FSMContext):
     )
 
 
-@router.callback_query(lambda c: c.data in goods.get_callbacks())
+@router.callback_query(lambda c: goods.has_callback(c.data))
 async def callback_payment_method_select(callback: CallbackQuery, state: FSMContext):
     await safe_answer(callback)
 
@@ -845,11 +841,29 @@ async def callback_admin_management(callback: CallbackQuery, state: FSMContext):
     if current_state in [BroadcastStates.waiting_for_message, BroadcastStates.waiting_for_confirmation]:
         await state.clear()
     
+    await _send_admin_management(callback, state)
+
+async def _send_admin_management(callback: CallbackQuery, state: FSMContext, text: str = None):
+    job = None
+    try:
+        job = await get_active_broadcast()
+    except Exception as e:
+        logging.error(f"Failed to load active broadcast: {e}", exc_info=True)
+
+    text = text or _("message_admin_management")
+    if job is not None:
+        key = "message_broadcast_job_paused" if job.status == "paused" else "message_broadcast_job_running"
+        text = _(key).format(
+            job_id=job.id,
+            processed=job.sent_count + job.blocked_count + job.failed_count,
+            total=job.total
+        ) + "\n\n" + text
+
     cleanup = MessageCleanup(glv.bot, state, glv.MESSAGE_CLEANUP_DEBUG)
     await cleanup.send_navigation(
         chat_id=callback.from_user.id,
-        text=_("message_admin_management"),
-        reply_markup=get_admin_management_keyboard(),
+        text=text,
+        reply_markup=get_admin_management_keyboard(broadcast_job=job),
         reuse_message=callback.message,
     )
 
@@ -869,49 +883,6 @@ async def callback_admin_broadcast(callback: CallbackQuery, state: FSMContext):
     
     await state.set_state(BroadcastStates.waiting_for_message)
 
-_broadcast_tasks: set = set()
-
-async def _run_broadcast(admin_id: int, broadcast_message: str, started_message_id: int, disable_notification: bool = False):
-    from db.methods import get_vpn_users
-
-    users = await get_vpn_users()
-    admin_ids = glv.config['ADMINS']
-    success_count = 0
-    fail_count = 0
-
-    for user in users:
-        if user.tg_id in admin_ids:
-            continue
-        try:
-            dismiss_keyboard = get_broadcast_dismiss_keyboard(lang='ru')
-            await glv.bot.send_message(
-                user.tg_id,
-                broadcast_message,
-                disable_web_page_preview=True,
-                disable_notification=disable_notification,
-                reply_markup=dismiss_keyboard
-            )
-            success_count += 1
-            await asyncio.sleep(0.5)
-        except Exception:
-            fail_count += 1
-
-    completed_text = _("message_broadcast_completed").format(success_count=success_count, fail_count=fail_count)
-    try:
-        await glv.bot.edit_message_text(
-            chat_id=admin_id,
-            message_id=started_message_id,
-            text=completed_text,
-            reply_markup=get_admin_management_keyboard(),
-        )
-    except Exception:
-        await glv.bot.send_message(
-            admin_id,
-            completed_text,
-            reply_markup=get_admin_management_keyboard(),
-        )
-
-
 @router.callback_query(F.data.in_({"broadcast_confirm_yes", "broadcast_confirm_silent"}), IsAdminCallbackFilter(is_admin=True))
 async def callback_broadcast_confirm(callback: CallbackQuery, state: FSMContext):
     await safe_answer(callback)
@@ -939,23 +910,50 @@ async def callback_broadcast_confirm(callback: CallbackQuery, state: FSMContext)
     await state.clear()
 
     disable_notification = callback.data == "broadcast_confirm_silent"
-    task = asyncio.create_task(_run_broadcast(callback.from_user.id, broadcast_message, started_message_id, disable_notification=disable_notification))
-    _broadcast_tasks.add(task)
-    task.add_done_callback(_broadcast_tasks.discard)
+    try:
+        await start_broadcast(
+            glv.bot,
+            callback.from_user.id,
+            broadcast_message,
+            callback.from_user.language_code,
+            started_message_id,
+            disable_notification=disable_notification
+        )
+    except Exception as e:
+        logging.error(f"Failed to start broadcast by {callback.from_user.id}: {e}", exc_info=True)
+        await _send_admin_management(callback, state, _("message_error"))
 
 @router.callback_query(F.data == "broadcast_confirm_no", IsAdminCallbackFilter(is_admin=True))
 async def callback_broadcast_confirm_no(callback: CallbackQuery, state: FSMContext):
     await safe_answer(callback)
     
-    cleanup = MessageCleanup(glv.bot, state, glv.MESSAGE_CLEANUP_DEBUG)
-    await cleanup.send_navigation(
-        chat_id=callback.from_user.id,
-        text=_("mesage_broadcast_cancelled"),
-        reply_markup=get_admin_management_keyboard(),
-        reuse_message=callback.message,
-    )
+    await _send_admin_management(callback, state, _("mesage_broadcast_cancelled"))
     
     await state.clear()
 
+@router.callback_query(F.data.startswith("broadcast_job_pause_"), IsAdminCallbackFilter(is_admin=True))
+async def callback_broadcast_job_pause(callback: CallbackQuery, state: FSMContext):
+    await safe_answer(callback)
+
+    job_id = int(callback.data.removeprefix("broadcast_job_pause_"))
+    paused = await pause_broadcast(job_id)
+    await _send_admin_management(callback, state, _("message_broadcast_paused") if paused else None)
+
+@router.callback_query(F.data.startswith("broadcast_job_resume_"), IsAdminCallbackFilter(is_admin=True))
+async def callback_broadcast_job_resume(callback: CallbackQuery, state: FSMContext):
+    await safe_answer(callback)
+
+    job_id = int(callback.data.removeprefix("broadcast_job_resume_"))
+    resumed = await resume_broadcast(glv.bot, job_id)
+    await _send_admin_management(callback, state, _("message_broadcast_resumed") if resumed else None)
+
+@router.callback_query(F.data.startswith("broadcast_job_cancel_"), IsAdminCallbackFilter(is_admin=True))
+async def callback_broadcast_job_cancel(callback: CallbackQuery, state: FSMContext):
+    await safe_answer(callback)
+
+    job_id = int(callback.data.removeprefix("broadcast_job_cancel_"))
+    cancelled = await cancel_broadcast(job_id)
+    await _send_admin_management(callback, state, _("message_broadcast_stopping") if cancelled else None)
+
 def register_callbacks(dp: Dispatcher):
     dp.include_router(router)
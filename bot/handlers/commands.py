@@ -14,7 +14,7 @@ from aiogram.fsm.context import FSMContext
 from keyboards import get_main_menu_keyboard
 from .messages import profile, help
 from .callbacks import _build_and_send_profile
-from db.methods import get_promo_code_by_code, has_activated_promo_code, activate_promo_code, create_vpn_user, get_vpn_user
+from db.methods import get_promo_code_by_code, has_activated_promo_code, activate_promo_code, create_vpn_user
 from utils import MessageCleanup, MessageType, referrals
 from panel import get_panel
 import glv
@@ -24,7 +24,7 @@ router = Router(name="commands-router")
 @router.message(
     Command("start")
 )
-async def start(message: Message, state: FSMContext):
+async def start(message: Message, state: FSMContext, vpn_user=None):
     tg_id = message.from_user.id
     
     cleanup = MessageCleanup(glv.bot, state, glv.MESSAGE_CLEANUP_DEBUG)
@@ -47,15 +47,13 @@ async def start(message: Message, state: FSMContext):
     
     await cleanup.cleanup_all(tg_id)
     
-    user = await get_vpn_user(tg_id)
-    is_new_user = user is None
-    
-    await create_vpn_user(tg_id)
+    user = vpn_user
+    if user is None:
+        user = await create_vpn_user(tg_id)
     
     await referrals.ensure_referral_code(tg_id)
     
     try:
-        user = await get_vpn_user(tg_id)
         if user:
             panel = get_panel()
             await panel.update_user_telegram_id(user.vpn_id, tg_id)
@@ -64,7 +62,6 @@ async def start(message: Message, state: FSMContext):
     
     args = message.text.split()
     
-    user = await get_vpn_user(tg_id)
     can_set_referrer = user is None or user.referred_by_id is None
     
     if can_set_referrer and len(args) > 1 and args[1].startswith("ref_"):
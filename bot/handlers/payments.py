@@ -17,6 +17,7 @@ from db.methods import (
     has_confirmed_payments,
     get_payment,
     get_pending_telegram_payment,
+    unit_of_work,
 )
 from keyboards import (
     get_install_subscription_keyboard,
@@ -164,16 +165,17 @@ async def success_payment(message: Message, state: FSMContext):
         )
         return
 
-    await add_payment(
-        message.from_user.id,
-        good["callback"],
-        message.from_user.language_code,
-        message.successful_payment.telegram_payment_charge_id,
-        PaymentPlatform.TELEGRAM,
-        True,
-        from_notification=from_notification,
-    )
-    await use_all_promo_codes(message.from_user.id)
+    async with unit_of_work():
+        await add_payment(
+            message.from_user.id,
+            good["callback"],
+            message.from_user.language_code,
+            message.successful_payment.telegram_payment_charge_id,
+            PaymentPlatform.TELEGRAM,
+            True,
+            from_notification=from_notification,
+        )
+        await use_all_promo_codes(message.from_user.id)
     
     if good.get("type") == "renew" and "months" in good:
         try:
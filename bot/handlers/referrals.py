@@ -6,6 +6,7 @@ from aiogram.fsm.state import State, StatesGroup
 
 from keyboards import get_referral_menu_keyboard
 from utils import MessageCleanup, try_delete_message, safe_answer, referrals, get_i18n_string
+from utils.bot_info import get_bot_username
 from db.methods import get_vpn_user
 import glv
 
@@ -24,8 +25,7 @@ async def callback_referral_menu(callback: CallbackQuery, state: FSMContext):
     stats = await referrals.get_referral_stats(tg_id)
     
     code = await referrals.ensure_referral_code(tg_id)
-    bot_info = await glv.bot.get_me()
-    bot_username = bot_info.username
+    bot_username = await get_bot_username()
     referral_link = f"https://t.me/{bot_username}?start=ref_{code}"
     
     text = f"{get_i18n_string('referral_stats_title', lang)}\n\n"
@@ -55,8 +55,7 @@ async def referral_inline_handler(inline_query: InlineQuery):
         await inline_query.answer([], cache_time=1)
         return
     
-    bot_info = await inline_query.bot.get_me()
-    bot_username = bot_info.username
+    bot_username = await get_bot_username()
     
     referral_link = f"https://t.me/{bot_username}?start=ref_{code}"
     
@@ -3,7 +3,7 @@ from aiogram.utils.i18n import gettext as _
 
 from utils import get_i18n_string
 
-def get_admin_management_keyboard(lang=None) -> InlineKeyboardMarkup:
+def get_admin_management_keyboard(lang=None, broadcast_job=None) -> InlineKeyboardMarkup:
     kb = [
         [
             InlineKeyboardButton(text=get_i18n_str("button_broadcast", lang), callback_data="admin_broadcast")
@@ -18,6 +18,16 @@ def get_admin_management_keyboard(lang=None) -> InlineKeyboardMarkup:
             InlineKeyboardButton(text=get_i18n_str("button_back", lang), callback_data="back_to_profile")
         ]
     ]
+
+    if broadcast_job is not None:
+        if broadcast_job.status == "paused":
+            toggle = InlineKeyboardButton(text=get_i18n_str("button_broadcast_resume", lang), callback_data=f"broadcast_job_resume_{broadcast_job.id}")
+        else:
+            toggle = InlineKeyboardButton(text=get_i18n_str("button_broadcast_pause", lang), callback_data=f"broadcast_job_pause_{broadcast_job.id}")
+        kb.insert(1, [
+            toggle,
+            InlineKeyboardButton(text=get_i18n_str("button_broadcast_stop", lang), callback_data=f"broadcast_job_cancel_{broadcast_job.id}")
+        ])
     
     return InlineKeyboardMarkup(inline_keyboard=kb)
 
@@ -7,7 +7,7 @@ from db.methods import get_user_promo_discount
 
 async def get_buy_menu_keyboard(tg_id: int, months: int, purchase_type: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    filtered_goods = [good for good in goods.get() if good['months'] == months and good["type"] == purchase_type]
+    filtered_goods = goods.get_by_type(purchase_type, months)
     discount = await get_user_promo_discount(tg_id)
 
     for good in filtered_goods:
@@ -8,7 +8,7 @@ from db.methods import get_user_promo_discount
 
 async def get_months_keyboard(tg_id: int) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    subscription_opts = [good for good in goods.get() if good["type"] == "renew"]
+    subscription_opts = goods.get_by_type("renew")
     month_to_min_price = defaultdict(lambda: float('inf'))
     for good in subscription_opts:
         month_to_min_price[good['months']] = min(month_to_min_price[good['months']], good['price']['ru'])
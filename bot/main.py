@@ -8,7 +8,6 @@ import aiohttp
 from aiogram import Bot, Dispatcher, enums, F
 from aiogram.client.default import DefaultBotProperties
 from aiogram.client.session.aiohttp import AiohttpSession
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.utils.i18n import I18n, SimpleI18nMiddleware
 from aiohttp import web
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
@@ -22,9 +21,17 @@ from handlers.promo_management import register_promo_management
 from handlers.referrals import register_referrals
 from handlers.admin_referrals import register_admin_referrals
 from middlewares.db_check import DBCheck
-from app.routes import check_crypto_payment, check_yookassa_payment, notify_user
+from middlewares.metrics import HandlerMetrics, TelegramRequestMetrics
+from app.routes import check_crypto_payment, check_yookassa_payment, notify_user, payment_inbox, notification_queue
+from app.metrics import metrics_middleware, metrics_handler
 from utils.traffic_checker import check_users_traffic
-from db.methods import cleanup_old_traffic_notifications
+from db.methods import cleanup_old_traffic_notifications, cleanup_old_messages
+from utils.lang import load_translations, reload_translations_if_changed
+from utils.broadcast import resume_unfinished_broadcasts
+from utils.fsm_storage import create_storage
+from utils.message_writer import user_message_writer
+from utils import yookassa, cryptomus
+from utils.payment_reconciler import PaymentReconciler
 import glv
 
 glv.bot = Bot(
@@ -32,9 +39,11 @@ glv.bot = Bot(
     session=AiohttpSession(timeout=aiohttp.ClientTimeout(total=30, sock_connect=5.0)),
     default=DefaultBotProperties(parse_mode=enums.ParseMode.HTML)
 )
-glv.storage = MemoryStorage()
+glv.bot.session.middleware(TelegramRequestMetrics())
+glv.storage = create_storage()
 glv.dp = Dispatcher(storage=glv.storage)
-app = web.Application()
+app = web.Application(middlewares=[metrics_middleware])
+payment_reconciler = PaymentReconciler(payment_inbox.notify)
 logging.basicConfig(level=logging.INFO, stream=sys.stdout,  format="%(asctime)s %(levelname)s %(message)s")
 
 async def on_startup(bot: Bot):
@@ -44,6 +53,31 @@ async def on_startup(bot: Bot):
         logging.error(f"Failed to set webhook: {e}")
         logging.warning("Bot will continue without webhook update")
     
+    try:
+        await cryptomus.client.start()
+    except Exception as e:
+        logging.error(f"Failed to start Cryptomus client: {e}", exc_info=True)
+    
+    try:
+        await payment_inbox.start()
+    except Exception as e:
+        logging.error(f"Failed to start payment inbox: {e}", exc_info=True)
+    
+    try:
+        await notification_queue.start()
+    except Exception as e:
+        logging.error(f"Failed to start notification queue: {e}", exc_info=True)
+    
+    try:
+        await payment_reconciler.start()
+    except Exception as e:
+        logging.error(f"Failed to start payment reconciler: {e}", exc_info=True)
+    
+    try:
+        await resume_unfinished_broadcasts(bot)
+    except Exception as e:
+        logging.error(f"Failed to resume unfinished broadcasts: {e}", exc_info=True)
+    
     logging.info("Scheduler tasks registered: cleanup daily at 03:00. Traffic notifications via Remnawave webhook.")
 
 async def run_scheduler():
@@ -54,12 +88,19 @@ async def run_scheduler():
     while True:
         now = datetime.now()
         
+        if glv.config['LOCALES_HOT_RELOAD']:
+            try:
+                reload_translations_if_changed()
+            except Exception as e:
+                logging.error(f"Error reloading translations: {e}", exc_info=True)
+        
         if now.hour == 3 and now.minute == 0:
             if last_cleanup_date != now.date():
                 try:
                     await cleanup_old_traffic_notifications(30)
+                    deleted_messages = await cleanup_old_messages(glv.config['MESSAGE_RETENTION_DAYS'])
                     last_cleanup_date = now.date()
-                    logging.info("Daily cleanup completed")
+                    logging.info(f"Daily cleanup completed: {deleted_messages} tracked message(s) older than {glv.config['MESSAGE_RETENTION_DAYS']} days removed")
                 except Exception as e:
                     logging.error(f"Error in daily cleanup: {e}", exc_info=True)
         
@@ -85,15 +126,29 @@ def setup_middlewares():
     
     db_check = DBCheck()
     glv.dp.update.outer_middleware(db_check)
+    
+    handler_metrics = HandlerMetrics()
+    glv.dp.message.middleware(handler_metrics)
+    glv.dp.callback_query.middleware(handler_metrics)
+    glv.dp.pre_checkout_query.middleware(handler_metrics)
 
 async def main():
+    load_translations()
     setup_routers()
     setup_middlewares()
     glv.dp.startup.register(on_startup)
+    glv.dp.shutdown.register(glv.storage.close)
+    glv.dp.shutdown.register(user_message_writer.close)
+    glv.dp.shutdown.register(payment_reconciler.close)
+    glv.dp.shutdown.register(payment_inbox.close)
+    glv.dp.shutdown.register(notification_queue.close)
+    glv.dp.shutdown.register(yookassa.close)
+    glv.dp.shutdown.register(cryptomus.client.close)
 
     app.router.add_post("/cryptomus_payment", check_crypto_payment)
     app.router.add_post("/yookassa_payment", check_yookassa_payment)
     app.router.add_post("/notify_user", notify_user)
+    app.router.add_get("/metrics", metrics_handler)
     
     webhook_requests_handler = SimpleRequestHandler(
         dispatcher=glv.dp,
@@ -0,0 +1,161 @@
+import re
+import time
+import bisect
+import functools
+from typing import Callable
+
+import httpx
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+class LatencyHistogram:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict = {}
+
+    def observe(self, seconds: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+        series['counts'][bisect.bisect_left(self.buckets, seconds)] += 1
+        series['sum'] += seconds
+        series['count'] += 1
+
+    def snapshot(self) -> list:
+        result = []
+        for key, series in self._series.items():
+            cumulative = []
+            total = 0
+            for count in series['counts']:
+                total += count
+                cumulative.append(total)
+            result.append({
+                'labels': dict(key),
+                'buckets': dict(zip(self.buckets + (float('inf'),), cumulative)),
+                'sum': series['sum'],
+                'count': series['count'],
+            })
+        return result
+
+class Counter:
+    def __init__(self):
+        self._series: dict = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._series[key] = self._series.get(key, 0) + amount
+
+    def snapshot(self) -> list:
+        return [{'labels': dict(key), 'value': value} for key, value in self._series.items()]
+
+_registry: dict = {}
+_collectors: list = []
+
+def register(name: str, help_text: str, metric):
+    _registry[name] = (help_text, metric)
+    return metric
+
+def histogram(name: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS) -> LatencyHistogram:
+    return register(name, help_text, LatencyHistogram(buckets))
+
+def counter(name: str, help_text: str) -> Counter:
+    return register(name, help_text, Counter())
+
+def register_collector(collector: Callable[[], list]):
+    _collectors.append(collector)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render() -> str:
+    lines = []
+    for name, (help_text, metric) in _registry.items():
+        lines.append(f"# HELP {name} {help_text}")
+        if isinstance(metric, LatencyHistogram):
+            lines.append(f"# TYPE {name} histogram")
+            for series in metric.snapshot():
+                for bound, count in series['buckets'].items():
+                    labels = {**series['labels'], 'le': _format_value(bound)}
+                    lines.append(f"{name}_bucket{_format_labels(labels)} {count}")
+                lines.append(f"{name}_sum{_format_labels(series['labels'])} {_format_value(series['sum'])}")
+                lines.append(f"{name}_count{_format_labels(series['labels'])} {series['count']}")
+        else:
+            lines.append(f"# TYPE {name} counter")
+            for series in metric.snapshot():
+                lines.append(f"{name}{_format_labels(series['labels'])} {_format_value(series['value'])}")
+
+    for collector in _collectors:
+        for name, metric_type, help_text, samples in collector():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+handler_latency = histogram('bot_handler_duration_seconds', 'Telegram update handler latency')
+db_latency = histogram('db_query_duration_seconds', 'db.methods call latency', DB_BUCKETS)
+db_reads = counter('db_reads_total', 'Replica-eligible reads by the database that served them')
+panel_latency = histogram('panel_request_duration_seconds', 'Remnawave panel HTTP request latency')
+telegram_latency = histogram('telegram_request_duration_seconds', 'Telegram Bot API request latency')
+telegram_retry_after = counter('telegram_retry_after_total', 'Telegram flood control (retry_after) responses')
+webhook_latency = histogram('webhook_request_duration_seconds', 'HTTP route latency of the aiohttp app')
+
+def timed(func, histogram: LatencyHistogram, **labels):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.monotonic()
+        status = 'error'
+        try:
+            result = await func(*args, **kwargs)
+            status = 'ok'
+            return result
+        finally:
+            histogram.observe(time.monotonic() - started, status=status, **labels)
+    return wrapper
+
+_ID_SEGMENT = re.compile(r'^(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})$')
+
+def endpoint_template(path: str, prefix: str = '') -> str:
+    if prefix and path.startswith(prefix):
+        path = path[len(prefix):]
+    segments = path.strip('/').split('/')
+    for index, segment in enumerate(segments):
+        if _ID_SEGMENT.match(segment) or (index and segments[index - 1].startswith('by-')):
+            segments[index] = '{id}'
+    return '/' + '/'.join(segments)
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    def __init__(self, histogram: LatencyHistogram, prefix: str = '', transport: httpx.AsyncBaseTransport = None):
+        self.histogram = histogram
+        self.prefix = prefix
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        status = 'error'
+        try:
+            response = await self._transport.handle_async_request(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            self.histogram.observe(
+                time.monotonic() - started,
+                endpoint=endpoint_template(request.url.path, self.prefix),
+                method=request.method,
+                status=status
+            )
+
+    async def aclose(self):
+        await self._transport.aclose()
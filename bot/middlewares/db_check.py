@@ -3,7 +3,10 @@ from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
 
-from db.methods import create_vpn_user
+from db.methods import get_or_create_vpn_user
+from db.user_context import open_user_context, close_user_context
+import resilience
+import glv
 
 class DBCheck(BaseMiddleware):
     async def __call__(
@@ -12,10 +15,19 @@ class DBCheck(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        user = data["event_from_user"]
-        try:
-            await create_vpn_user(user.id)
-        except Exception:
-            logging.error(f"Failed to create/check user {user.id} in DB", exc_info=True)
-        result = await handler(event, data)
-        return result
\ No newline at end of file
+        with resilience.deadline(glv.config['UPDATE_DEADLINE']):
+            user = data.get("event_from_user")
+            if user is None:
+                return await handler(event, data)
+
+            token = open_user_context(user.id)
+            try:
+                vpn_user = None
+                try:
+                    vpn_user = await get_or_create_vpn_user(user.id)
+                except Exception:
+                    logging.error(f"Failed to create/check user {user.id} in DB", exc_info=True)
+                data["vpn_user"] = vpn_user
+                return await handler(event, data)
+            finally:
+                close_user_context(token)
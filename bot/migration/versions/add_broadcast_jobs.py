@@ -0,0 +1,61 @@
+"""Add broadcast jobs and deliveries tables
+
+Revision ID: a1b2c3d4e5f7
+Revises: f1a2b3c4d5e6
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'a1b2c3d4e5f7'
+down_revision = 'f1a2b3c4d5e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    if 'broadcast_jobs' not in tables:
+        op.create_table('broadcast_jobs',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('admin_id', sa.BigInteger(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('lang', sa.String(length=8), nullable=True),
+        sa.Column('disable_notification', sa.Boolean(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('cursor', sa.BigInteger(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('sent_count', sa.Integer(), nullable=False),
+        sa.Column('blocked_count', sa.Integer(), nullable=False),
+        sa.Column('failed_count', sa.Integer(), nullable=False),
+        sa.Column('status_message_id', sa.BigInteger(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_broadcast_jobs_status', 'broadcast_jobs', ['status'], unique=False)
+
+    if 'broadcast_deliveries' not in tables:
+        op.create_table('broadcast_deliveries',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('job_id', sa.BigInteger(), nullable=False),
+        sa.Column('recipient_id', sa.BigInteger(), nullable=False),
+        sa.Column('tg_id', sa.BigInteger(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('delivered_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_broadcast_deliveries_job_recipient', 'broadcast_deliveries', ['job_id', 'recipient_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_broadcast_deliveries_job_recipient', table_name='broadcast_deliveries')
+    op.drop_table('broadcast_deliveries')
+    op.drop_index('ix_broadcast_jobs_status', table_name='broadcast_jobs')
+    op.drop_table('broadcast_jobs')
@@ -0,0 +1,34 @@
+"""Add FSM storage table
+
+Revision ID: b2c3d4e5f6a8
+Revises: a1b2c3d4e5f7
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'b2c3d4e5f6a8'
+down_revision = 'a1b2c3d4e5f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    if 'fsm_storage' not in tables:
+        op.create_table('fsm_storage',
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('state', sa.String(length=255), nullable=True),
+        sa.Column('data', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('fsm_storage')
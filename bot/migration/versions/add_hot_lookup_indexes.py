@@ -0,0 +1,56 @@
+"""Add indexes for hot lookups
+
+Revision ID: f6a7b8c9d0e2
+Revises: e5f6a7b8c9d1
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'f6a7b8c9d0e2'
+down_revision = 'e5f6a7b8c9d1'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = (
+    ('vpnusers', 'ix_vpnusers_tg_id', ['tg_id'], False),
+    ('vpnusers', 'ix_vpnusers_vpn_id', ['vpn_id'], False),
+    ('payments', 'ix_payments_payment_id_type', ['payment_id', 'type'], False),
+    ('payments', 'ix_payments_tg_id_confirmed_created_at', ['tg_id', 'confirmed', 'created_at'], False),
+    ('user_promo_codes', 'ix_user_promo_codes_tg_id_used_promo_code_id', ['tg_id', 'used', 'promo_code_id'], False),
+    ('referral_bonuses', 'ix_referral_bonuses_inviter_id', ['inviter_id'], False),
+    ('referral_bonuses', 'ix_referral_bonuses_referee_id', ['referee_id'], False),
+    ('referral_bonuses', 'ix_referral_bonuses_payment_id', ['payment_id'], False),
+    ('traffic_notifications', 'ix_traffic_notifications_tg_id_type_sent_at', ['tg_id', 'notification_type', 'sent_at'], False),
+    ('traffic_notifications', 'ix_traffic_notifications_sent_at', ['sent_at'], False),
+)
+
+SUPERSEDED = (
+    ('traffic_notifications', 'ix_traffic_notifications_tg_id', ['tg_id']),
+)
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    for table, name, columns, unique in INDEXES:
+        indexes = [idx['name'] for idx in inspector.get_indexes(table)]
+        if name not in indexes:
+            op.create_index(name, table, columns, unique=unique)
+
+    for table, name, _ in SUPERSEDED:
+        indexes = [idx['name'] for idx in inspector.get_indexes(table)]
+        if name in indexes:
+            op.drop_index(name, table_name=table)
+
+
+def downgrade() -> None:
+    for table, name, columns in SUPERSEDED:
+        op.create_index(name, table, columns, unique=False)
+
+    for table, name, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,43 @@
+"""Add payment inbox table
+
+Revision ID: c3d4e5f6a7b9
+Revises: b2c3d4e5f6a8
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'c3d4e5f6a7b9'
+down_revision = 'b2c3d4e5f6a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    if 'payment_inbox' not in tables:
+        op.create_table('payment_inbox',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('provider', sa.Integer(), nullable=False),
+        sa.Column('payment_id', sa.String(length=64), nullable=False),
+        sa.Column('tg_id', sa.BigInteger(), nullable=False),
+        sa.Column('event', sa.String(length=16), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('provider', 'payment_id', name='uq_payment_inbox_provider_payment')
+        )
+        op.create_index('ix_payment_inbox_status', 'payment_inbox', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_payment_inbox_status', table_name='payment_inbox')
+    op.drop_table('payment_inbox')
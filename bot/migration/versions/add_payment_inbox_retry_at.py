@@ -0,0 +1,28 @@
+"""Add retry_at to payment_inbox
+
+Revision ID: c9d0e1f2a3b5
+Revises: b8c9d0e1f2a4
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'c9d0e1f2a3b5'
+down_revision = 'b8c9d0e1f2a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    columns = [col['name'] for col in inspector.get_columns('payment_inbox')]
+
+    if 'retry_at' not in columns:
+        op.add_column('payment_inbox', sa.Column('retry_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('payment_inbox', 'retry_at')
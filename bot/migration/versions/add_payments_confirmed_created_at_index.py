@@ -0,0 +1,28 @@
+"""Add payments (confirmed, created_at) index
+
+Revision ID: d4e5f6a7b8c0
+Revises: c3d4e5f6a7b9
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'd4e5f6a7b8c0'
+down_revision = 'c3d4e5f6a7b9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    indexes = [idx['name'] for idx in inspector.get_indexes('payments')]
+
+    if 'ix_payments_confirmed_created_at' not in indexes:
+        op.create_index('ix_payments_confirmed_created_at', 'payments', ['confirmed', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_payments_confirmed_created_at', table_name='payments')
@@ -0,0 +1,34 @@
+"""Add user_messages lookup and retention indexes
+
+Revision ID: e5f6a7b8c9d1
+Revises: d4e5f6a7b8c0
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'e5f6a7b8c9d1'
+down_revision = 'd4e5f6a7b8c0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    indexes = [idx['name'] for idx in inspector.get_indexes('user_messages')]
+
+    if 'ix_user_messages_tg_id_created_at' not in indexes:
+        op.create_index('ix_user_messages_tg_id_created_at', 'user_messages', ['tg_id', 'created_at', 'message_type', 'message_id'], unique=False)
+    if 'ix_user_messages_created_at' not in indexes:
+        op.create_index('ix_user_messages_created_at', 'user_messages', ['created_at'], unique=False)
+    if 'ix_user_messages_tg_id' in indexes:
+        op.drop_index('ix_user_messages_tg_id', table_name='user_messages')
+
+
+def downgrade() -> None:
+    op.create_index('ix_user_messages_tg_id', 'user_messages', ['tg_id'], unique=False)
+    op.drop_index('ix_user_messages_created_at', table_name='user_messages')
+    op.drop_index('ix_user_messages_tg_id_created_at', table_name='user_messages')
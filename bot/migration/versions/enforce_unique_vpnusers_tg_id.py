@@ -0,0 +1,34 @@
+"""Enforce unique vpnusers.tg_id
+
+Revision ID: a7b8c9d0e1f3
+Revises: f6a7b8c9d0e2
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'a7b8c9d0e1f3'
+down_revision = 'f6a7b8c9d0e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    indexes = [idx['name'] for idx in inspector.get_indexes('vpnusers')]
+
+    conn.execute(sa.text(
+        "DELETE duplicate FROM vpnusers duplicate "
+        "JOIN vpnusers original ON original.tg_id = duplicate.tg_id AND original.id < duplicate.id"
+    ))
+    op.create_index('uq_vpnusers_tg_id', 'vpnusers', ['tg_id'], unique=True)
+    if 'ix_vpnusers_tg_id' in indexes:
+        op.drop_index('ix_vpnusers_tg_id', table_name='vpnusers')
+
+
+def downgrade() -> None:
+    op.create_index('ix_vpnusers_tg_id', 'vpnusers', ['tg_id'], unique=False)
+    op.drop_index('uq_vpnusers_tg_id', table_name='vpnusers')
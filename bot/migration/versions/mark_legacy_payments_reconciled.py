@@ -0,0 +1,35 @@
+"""Mark payments created before the payment inbox as reconciled
+
+Revision ID: b8c9d0e1f2a4
+Revises: a7b8c9d0e1f3
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'b8c9d0e1f2a4'
+down_revision = 'a7b8c9d0e1f3'
+branch_labels = None
+depends_on = None
+
+
+# Invoices expire after an hour on both providers; anything younger may still
+# be paid and is left for the reconciler to pick up.
+PAYMENT_EXPIRY_HOURS = 1
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text(
+        "INSERT IGNORE INTO payment_inbox (provider, payment_id, tg_id, event, status, attempts, created_at) "
+        "SELECT p.type, p.payment_id, p.tg_id, 'paid', 'legacy', 0, NOW() FROM payments p "
+        "LEFT JOIN payment_inbox i ON i.provider = p.type AND i.payment_id = p.payment_id "
+        "WHERE p.confirmed = 0 AND p.type IN (0, 1) AND p.payment_id IS NOT NULL AND i.id IS NULL "
+        "AND p.created_at < NOW() - INTERVAL :hours HOUR"
+    ), {'hours': PAYMENT_EXPIRY_HOURS})
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM payment_inbox WHERE status = 'legacy'")
@@ -1,5 +1,6 @@
 import time
 from abc import ABC, abstractmethod
+from typing import AsyncIterator
 from .models import PanelProfile
 import glv
 
@@ -39,6 +40,20 @@ class Panel(ABC):
     async def reset_subscription_data_limit(self, username: str):
         pass
 
+    @abstractmethod
+    def iter_users(self, page_size: int = None, concurrency: int = None) -> AsyncIterator[dict]:
+        pass
+
+    @abstractmethod
+    async def bulk_sync(self) -> dict[int, PanelProfile]:
+        pass
+
+    def invalidate_panel_user(self, tg_id: int = None, username: str = None):
+        pass
+
+    def cache_stats(self) -> dict:
+        return {}
+
     @staticmethod
     def get_subscription_end_date(months: int, additional=False) -> int:
         return (0 if additional else int(time.time())) + 60 * 60 * 24 * 30 * months
@@ -1,12 +1,31 @@
 from datetime import datetime, timedelta, UTC
+import asyncio
+import functools
+import itertools
+from collections import deque
+from typing import AsyncIterator
 import httpx
 import logging
 from pydantic import ValidationError
 from .panel import Panel
 from .models import PanelProfile
-from db.methods import get_vpn_user, get_marzban_profile_by_vpn_id
+from .cache import TTLCache
+from db.methods import get_vpn_user, get_marzban_profile_by_vpn_id, get_vpn_users
+import metrics
+import resilience
 import glv
 
+def _invalidates_profile(func):
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        username = kwargs.get('username', args[0] if args else None)
+        self.invalidate_panel_user(username=username)
+        try:
+            return await func(self, *args, **kwargs)
+        finally:
+            self.invalidate_panel_user(username=username)
+    return wrapper
+
 class RemnawavePanel(Panel):
     def __init__(self):
         headers = {
@@ -17,8 +36,34 @@ class RemnawavePanel(Panel):
             'Authorization': f"Bearer {glv.config['REMNAWAVE_TOKEN']}"
         }
         api_base_url = f"{glv.config['PANEL_HOST']}/api"
-        client = httpx.AsyncClient(headers=headers, base_url=api_base_url, timeout=5.0)
+        client = httpx.AsyncClient(
+            headers=headers,
+            base_url=api_base_url,
+            timeout=5.0,
+            transport=resilience.ResilientTransport(
+                metrics.InstrumentedTransport(metrics.panel_latency, prefix=httpx.URL(api_base_url).path.rstrip('/')),
+                breaker=resilience.CircuitBreaker(
+                    'panel',
+                    failure_threshold=glv.config['PANEL_BREAKER_THRESHOLD'],
+                    reset_timeout=glv.config['PANEL_BREAKER_RESET']
+                ),
+                retry=resilience.RetryPolicy(attempts=3, base_delay=0.2, retry_on=resilience.HTTP_RETRY_ON)
+            )
+        )
         self.client = client
+        self._profile_cache = TTLCache(
+            maxsize=glv.config['PANEL_CACHE_SIZE'],
+            ttl=glv.config['PANEL_CACHE_TTL']
+        )
+
+    def invalidate_panel_user(self, tg_id: int = None, username: str = None):
+        if tg_id is not None:
+            self._profile_cache.invalidate(tg_id)
+        if username is not None:
+            self._profile_cache.invalidate_where(lambda key, value: value[1] == username)
+
+    def cache_stats(self) -> dict:
+        return self._profile_cache.stats()
 
     def _extract_used_traffic(self, user_data: dict) -> int:
         if 'usedTrafficBytes' in user_data:
@@ -29,6 +74,66 @@ class RemnawavePanel(Panel):
             return user_data['userTraffic'].get('usedTrafficBytes', 0)
         return 0
 
+    def _profile_from_user_data(self, user_data: dict, subscription_url: str = None) -> PanelProfile:
+        return PanelProfile(
+            username=user_data['username'],
+            status=user_data['status'].lower(),
+            subscription_url=subscription_url or user_data.get('subscriptionUrl') or user_data.get('subscription_url') or "",
+            used_traffic=self._extract_used_traffic(user_data),
+            data_limit=user_data.get('trafficLimitBytes') or user_data.get('traffic_limit_bytes'),
+            expire=datetime.fromisoformat(user_data['expireAt'].replace('Z', '+00:00')) if user_data.get('expireAt') else None
+        )
+
+    async def _get_users_page(self, start: int, size: int) -> tuple[list, int]:
+        response = await self.client.get("/users", params={'start': start, 'size': size})
+        response.raise_for_status()
+        data = response.json()['response']
+        return data.get('users', []), data.get('total', 0)
+
+    async def iter_users(self, page_size: int = None, concurrency: int = None) -> AsyncIterator[dict]:
+        page_size = page_size or glv.config['PANEL_PAGE_SIZE']
+        concurrency = concurrency or glv.config['PANEL_PAGE_CONCURRENCY']
+
+        users, total = await self._get_users_page(0, page_size)
+        for user in users:
+            yield user
+        if len(users) < page_size or total <= page_size:
+            return
+
+        starts = iter(range(page_size, total, page_size))
+        pending = deque(
+            asyncio.create_task(self._get_users_page(start, page_size))
+            for start in itertools.islice(starts, concurrency)
+        )
+        try:
+            while pending:
+                page, _total = await pending.popleft()
+                next_start = next(starts, None)
+                if next_start is not None:
+                    pending.append(asyncio.create_task(self._get_users_page(next_start, page_size)))
+                for user in page:
+                    yield user
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def bulk_sync(self) -> dict:
+        vpn_to_tg = {user.vpn_id: user.tg_id for user in await get_vpn_users() if user.vpn_id}
+        snapshot = {}
+        panel_users_count = 0
+        async for user_data in self.iter_users():
+            panel_users_count += 1
+            tg_id = vpn_to_tg.get(user_data.get('username'))
+            if tg_id is None:
+                continue
+            try:
+                snapshot[tg_id] = self._profile_from_user_data(user_data)
+            except (KeyError, ValueError, ValidationError) as e:
+                logging.warning(f"Skipping malformed panel user {user_data.get('username')}: {e}")
+        logging.info(f"Panel bulk sync: {len(snapshot)} profile(s) matched out of {panel_users_count} panel user(s)")
+        return snapshot
+
     async def _get_default_squad(self) -> dict | None:
         try:
             response = await self.client.get("/internal-squads")
@@ -110,40 +215,43 @@ class RemnawavePanel(Panel):
                 return False
 
     async def get_panel_user(self, tg_id: int) -> PanelProfile:
+        try:
+            profile, _vpn_id = await self._profile_cache.get_or_load(tg_id, lambda: self._load_panel_user(tg_id))
+        except Exception:
+            return None
+        return profile
+
+    async def _load_panel_user(self, tg_id: int) -> tuple:
         result = await get_vpn_user(tg_id)
         if result is None:
-            return None
+            return None, None
+        return await self._fetch_panel_user(result.vpn_id), result.vpn_id
+
+    async def _fetch_panel_user(self, vpn_id: str) -> PanelProfile:
         try:
-            response = await self.client.get(f"/users/by-username/{result.vpn_id}")
+            response = await self.client.get(f"/users/by-username/{vpn_id}")
             response.raise_for_status()
             data = response.json()
             user_data = data.get('response')
             if not user_data:
-                logging.warning(f"User {result.vpn_id} not found in API response")
+                logging.warning(f"User {vpn_id} not found in API response")
                 return None
             
             subscription_url = user_data.get('subscriptionUrl') or user_data.get('subscription_url') or ""
             if not subscription_url and user_data.get('uuid'):
                 subscription_url = await self._get_subscription_url(user_data['uuid'])
             
-            return PanelProfile(
-                username=user_data['username'],
-                status=user_data['status'].lower(),
-                subscription_url=subscription_url,
-                used_traffic=self._extract_used_traffic(user_data),
-                data_limit=user_data.get('trafficLimitBytes') or user_data.get('traffic_limit_bytes'),
-                expire=datetime.fromisoformat(user_data['expireAt'].replace('Z', '+00:00')) if user_data.get('expireAt') else None
-            )
+            return self._profile_from_user_data(user_data, subscription_url)
         except Exception as e:
             if "404" not in str(e):
-                logging.error(f"Error getting user by username {result.vpn_id}: {e}")
+                logging.error(f"Error getting user by username {vpn_id}: {e}")
             try:
-                response = await self.client.get(f"/users?username={result.vpn_id}")
+                response = await self.client.get(f"/users?username={vpn_id}")
                 response.raise_for_status()
                 data = response.json()
                 user_data = None
                 for user in data['response']['users']:
-                    if user['username'] == result.vpn_id:
+                    if user['username'] == vpn_id:
                         user_data = user
                         break
                 if not user_data:
@@ -153,18 +261,12 @@ class RemnawavePanel(Panel):
                 if not subscription_url and user_data.get('uuid'):
                     subscription_url = await self._get_subscription_url(user_data['uuid'])
                 
-                return PanelProfile(
-                    username=user_data['username'],
-                    status=user_data['status'].lower(),
-                    subscription_url=subscription_url,
-                    used_traffic=self._extract_used_traffic(user_data),
-                    data_limit=user_data.get('trafficLimitBytes') or user_data.get('traffic_limit_bytes'),
-                    expire=datetime.fromisoformat(user_data['expireAt'].replace('Z', '+00:00')) if user_data.get('expireAt') else None
-                )
+                return self._profile_from_user_data(user_data, subscription_url)
             except Exception as e2:
-                logging.error(f"Error getting user from users list {result.vpn_id}: {e2}")
-                return None
+                logging.error(f"Error getting user from users list {vpn_id}: {e2}")
+                raise
 
+    @_invalidates_profile
     async def generate_subscription(self, username: str, months: int, data_limit: int) -> PanelProfile:
         res = await self.check_if_user_exists(username)
         if res:
@@ -248,6 +350,7 @@ class RemnawavePanel(Panel):
             except Exception as e:
                 raise
 
+    @_invalidates_profile
     async def generate_test_subscription(self, username) -> PanelProfile:
         res = await self.check_if_user_exists(username)
         if res:
@@ -330,6 +433,7 @@ class RemnawavePanel(Panel):
             except Exception as e:
                 raise
 
+    @_invalidates_profile
     async def update_subscription_data_limit(self, username: str, data_limit: int) -> PanelProfile:
         if not await self.check_if_user_exists(username):
             return None
@@ -361,6 +465,7 @@ class RemnawavePanel(Panel):
         except Exception as e:
             raise
 
+    @_invalidates_profile
     async def set_subscription_data_limit(self, username: str, data_limit: int) -> PanelProfile:
         if not await self.check_if_user_exists(username):
             return None
@@ -394,6 +499,7 @@ class RemnawavePanel(Panel):
         except Exception as e:
             raise
 
+    @_invalidates_profile
     async def reset_subscription_data_limit(self, username):
         if not await self.check_if_user_exists(username):
             return None
@@ -0,0 +1,206 @@
+import time
+import random
+import asyncio
+import logging
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+import httpx
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+HTTP_RETRY_ON = (httpx.ConnectError, httpx.HTTPStatusError)
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    pass
+
+_deadline: ContextVar[Optional[tuple]] = ContextVar('deadline', default=None)
+_retrying: ContextVar[bool] = ContextVar('retrying', default=False)
+_active_breaker: ContextVar[Optional['CircuitBreaker']] = ContextVar('active_breaker', default=None)
+
+def _current_deadline() -> Optional[float]:
+    current = _deadline.get()
+    if current is None or current[1] is not asyncio.current_task():
+        return None
+    return current[0]
+
+@contextmanager
+def deadline(seconds: float):
+    current = _current_deadline()
+    expires = time.monotonic() + seconds
+    token = _deadline.set((expires if current is None else min(current, expires), asyncio.current_task()))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining() -> Optional[float]:
+    expires = _current_deadline()
+    if expires is None:
+        return None
+    return expires - time.monotonic()
+
+async def _within_deadline(func: Callable, *args, **kwargs):
+    left = remaining()
+    if left is None:
+        return await func(*args, **kwargs)
+    if left <= 0:
+        raise DeadlineExceeded("Deadline exceeded before the call started")
+    try:
+        async with asyncio.timeout(left):
+            return await func(*args, **kwargs)
+    except TimeoutError as e:
+        raise DeadlineExceeded(f"Deadline exceeded after {left:.2f}s") from e
+
+breakers: list = []
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_total = 0
+        self.rejected_total = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        breakers.append(self)
+
+    def before_call(self):
+        if self.state == CLOSED:
+            return
+        retry_in = self._opened_at + self.reset_timeout - time.monotonic()
+        if self.state == OPEN and retry_in <= 0:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return
+        self.rejected_total += 1
+        raise CircuitOpenError(self.name, max(retry_in, 0.0))
+
+    def record_success(self):
+        self._trial_running = False
+        if self.state != CLOSED:
+            logging.info(f"Circuit '{self.name}' closed")
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self._trial_running = False
+        self.failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            if self.state == CLOSED:
+                logging.warning(f"Circuit '{self.name}' opened after {self.failures} consecutive failure(s)")
+            self.state = OPEN
+            self.opened_total += 1
+            self._opened_at = time.monotonic()
+
+    def record_ignored(self):
+        self._trial_running = False
+
+class RetryPolicy:
+    def __init__(self, attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0, retry_on: tuple = (Exception,)):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(self, func: Callable, *args, **kwargs):
+        if _retrying.get():
+            return await func(*args, **kwargs)
+        token = _retrying.set(True)
+        try:
+            for attempt in range(self.attempts):
+                try:
+                    return await func(*args, **kwargs)
+                except CircuitOpenError:
+                    raise
+                except self.retry_on as e:
+                    if attempt == self.attempts - 1:
+                        raise
+                    delay = self.delay(attempt)
+                    left = remaining()
+                    if left is not None and left <= delay:
+                        raise
+                    logging.warning(f"{getattr(func, '__name__', func)} attempt {attempt + 1}/{self.attempts} failed: {e}; retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+        finally:
+            _retrying.reset(token)
+
+def guarded(func: Callable, breaker: CircuitBreaker, failures: tuple = (Exception,), retry: RetryPolicy = None, should_retry: Callable[[], bool] = None):
+    @functools.wraps(func)
+    async def attempt(*args, **kwargs):
+        breaker.before_call()
+        token = _active_breaker.set(breaker)
+        try:
+            result = await _within_deadline(func, *args, **kwargs)
+        except failures:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.record_ignored()
+            raise
+        finally:
+            _active_breaker.reset(token)
+        breaker.record_success()
+        return result
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if _active_breaker.get() is breaker:
+            return await func(*args, **kwargs)
+        if retry is None or (should_retry is not None and not should_retry()):
+            return await attempt(*args, **kwargs)
+        return await retry.call(attempt, *args, **kwargs)
+    return wrapper
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport, breaker: CircuitBreaker, retry: RetryPolicy = None):
+        self._transport = transport
+        self.breaker = breaker
+        self.retry = retry
+
+    async def _attempt(self, request: httpx.Request) -> httpx.Response:
+        self.breaker.before_call()
+        try:
+            response = await _within_deadline(self._transport.handle_async_request, request)
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.record_ignored()
+            raise
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            if request.method in IDEMPOTENT_METHODS and self.retry is not None:
+                await response.aread()
+                raise httpx.HTTPStatusError(f"Server error {response.status_code}", request=request, response=response)
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.retry is None or request.method not in IDEMPOTENT_METHODS:
+            return await self._attempt(request)
+        try:
+            return await self.retry.call(self._attempt, request)
+        except httpx.HTTPStatusError as e:
+            return e.response
+
+    async def aclose(self):
+        await self._transport.aclose()
@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEST_ENVIRONMENT = {
+    'BOT_TOKEN': '123456789:TEST',
+    'SHOP_NAME': 'Test',
+    'EMAIL': 'test@example.com',
+    'PANEL_HOST': 'http://127.0.0.1:9',
+    'REMNAWAVE_TOKEN': 'test',
+    'WEBHOOK_URL': 'http://127.0.0.1',
+    'WEBHOOK_PORT': '0',
+    'WEBHOOK_SECRET': 'test',
+    'CRYPTO_TOKEN': 'test-crypto-token',
+    'MERCHANT_UUID': 'test-merchant',
+    'CRYPTO_PAYMENT_ENABLED': 'true',
+    'DB_USER': 'test',
+    'DB_PASS': 'test',
+    'DB_ADDRESS': '127.0.0.1',
+    'DB_PORT': '3306',
+    'DB_NAME': 'test',
+}
+for key, value in TEST_ENVIRONMENT.items():
+    os.environ.setdefault(key, value)
+
+# utils and keyboards import each other; load them in the order main.py ends up using
+import keyboards  # noqa: E402,F401
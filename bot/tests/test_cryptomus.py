@@ -0,0 +1,113 @@
+import os
+import json
+import asyncio
+
+import aiohttp
+import pytest
+
+from benchmark.stubs import ServiceStub
+from utils import cryptomus, goods
+from utils.webhook_data import get_sign
+import glv
+
+GOODS_EXAMPLE = os.path.join(os.path.dirname(__file__), '..', '..', 'goods.example.json')
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(cryptomus, 'RETRY_BASE_DELAY', 0)
+
+async def _with_client(test, max_attempts: int = 3, timeout: float = cryptomus.REQUEST_TIMEOUT):
+    stub = ServiceStub()
+    await stub.start()
+    client = cryptomus.CryptomusClient(base_url=stub.url, concurrency=2, max_attempts=max_attempts, timeout=timeout)
+    try:
+        return await test(stub, client)
+    finally:
+        await client.close()
+        await stub.close()
+
+def _cryptomus_requests(stub: ServiceStub, path: str) -> list:
+    return [entry for entry in stub.requests if entry[1] == path]
+
+def test_create_payment_signs_request(monkeypatch):
+    monkeypatch.setattr(goods, 'catalog', goods.Catalog(GOODS_EXAMPLE))
+
+    async def test(stub, client):
+        monkeypatch.setattr(cryptomus, 'client', client)
+        callback = goods.get_callbacks()[0]
+        payment = await cryptomus.create_payment(42, callback, 'en', amount_override=1.5)
+
+        assert payment['amount'] == '1.50'
+        assert payment['order_id'] in stub.cryptomus_payments
+        assert payment['url'].endswith(payment['order_id'])
+
+        _, _, headers, body = _cryptomus_requests(stub, '/v1/payment')[0]
+        data = json.loads(body)
+        assert headers['merchant'] == glv.config['MERCHANT_UUID']
+        assert headers['sign'] == get_sign(data, glv.config['CRYPTO_TOKEN'])
+        assert data['url_callback'] == glv.config['WEBHOOK_URL'] + '/cryptomus_payment'
+
+    asyncio.run(_with_client(test))
+
+def test_get_payment_status(monkeypatch):
+    async def test(stub, client):
+        monkeypatch.setattr(cryptomus, 'client', client)
+        stub.cryptomus_payments['order-1'] = 'paid'
+        assert await cryptomus.get_payment_status('order-1') == 'paid'
+
+    asyncio.run(_with_client(test))
+
+def test_retries_server_errors():
+    async def test(stub, client):
+        stub.fail('/v1/payment', times=2, status=502)
+        result = await client.request('/v1/payment', {'order_id': 'order-2', 'amount': '1.00'})
+
+        assert result['order_id'] == 'order-2'
+        assert len(_cryptomus_requests(stub, '/v1/payment')) == 3
+
+    asyncio.run(_with_client(test))
+
+def test_gives_up_after_max_attempts():
+    async def test(stub, client):
+        stub.fail('/v1/payment', times=5, status=503)
+        with pytest.raises(Exception, match='Error: 503'):
+            await client.request('/v1/payment', {'order_id': 'order-3', 'amount': '1.00'})
+        assert len(_cryptomus_requests(stub, '/v1/payment')) == 3
+
+    asyncio.run(_with_client(test))
+
+def test_client_errors_are_not_retried():
+    async def test(stub, client):
+        with pytest.raises(Exception, match='Error: 404'):
+            await client.request('/v1/payment/info', {'order_id': 'missing'})
+        assert len(_cryptomus_requests(stub, '/v1/payment/info')) == 1
+
+    asyncio.run(_with_client(test))
+
+def test_connection_errors_are_retried():
+    async def test(stub, client):
+        await stub.close()
+        with pytest.raises(aiohttp.ClientConnectionError):
+            await client.request('/v1/payment', {'order_id': 'order-4', 'amount': '1.00'})
+        assert client.latency.snapshot()[0]['count'] == 3
+
+    asyncio.run(_with_client(test))
+
+def test_timeouts_are_not_retried():
+    async def test(stub, client):
+        stub.latency = 0.5
+        with pytest.raises(asyncio.TimeoutError):
+            await client.request('/v1/payment', {'order_id': 'order-6', 'amount': '1.00'})
+        assert len(_cryptomus_requests(stub, '/v1/payment')) == 1
+
+    asyncio.run(_with_client(test, timeout=0.1))
+
+def test_latency_is_recorded_per_outcome():
+    async def test(stub, client):
+        stub.fail('/v1/payment', times=1, status=500)
+        await client.request('/v1/payment', {'order_id': 'order-5', 'amount': '1.00'})
+
+        outcomes = {series['labels']['outcome']: series['count'] for series in client.latency.snapshot()}
+        assert outcomes == {'500': 1, '200': 1}
+
+    asyncio.run(_with_client(test))
@@ -0,0 +1,24 @@
+import asyncio
+
+import pytest
+
+from benchmark import explain
+
+def _database_available() -> bool:
+    from db.methods import engine
+
+    async def probe():
+        try:
+            async with engine.connect():
+                return True
+        except Exception:
+            return False
+        finally:
+            await engine.dispose()
+    return asyncio.run(probe())
+
+pytestmark = pytest.mark.skipif(not _database_available(), reason="needs a throwaway MariaDB migrated with `alembic upgrade head` (DB_* variables)")
+
+def test_hot_queries_use_indexes():
+    failures = asyncio.run(explain._main())
+    assert not failures, "\n\n".join(explain.describe(statement, row) for statement, row in failures)
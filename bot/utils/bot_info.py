@@ -0,0 +1,9 @@
+import glv
+
+_bot_username = None
+
+async def get_bot_username() -> str:
+    global _bot_username
+    if _bot_username is None:
+        _bot_username = (await glv.bot.get_me()).username
+    return _bot_username
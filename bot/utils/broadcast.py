@@ -0,0 +1,338 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNotFound, TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup
+
+from db.methods import (
+    get_vpn_user_ids_page,
+    count_vpn_users,
+    create_broadcast_job,
+    get_broadcast_job,
+    get_broadcast_jobs_by_status,
+    update_broadcast_job_status,
+    save_broadcast_progress,
+    get_broadcast_delivered_ids,
+)
+from keyboards import get_admin_management_keyboard, get_broadcast_dismiss_keyboard
+from utils.lang import get_i18n_string, DEFAULT_LANGUAGE
+from utils.rate_limit import telegram_bucket
+import glv
+
+RECIPIENTS_CHUNK_SIZE = 1000
+PROGRESS_INTERVAL = 5.0
+PROGRESS_FLUSH_SIZE = 100
+MAX_SEND_ATTEMPTS = 3
+
+SENT = 'sent'
+BLOCKED = 'blocked'
+FAILED = 'failed'
+
+JOB_RUNNING = 'running'
+JOB_PAUSED = 'paused'
+JOB_CANCELLED = 'cancelled'
+JOB_COMPLETED = 'completed'
+JOB_ACTIVE_STATUSES = (JOB_RUNNING, JOB_PAUSED)
+
+class BroadcastEngine:
+    def __init__(
+        self,
+        bot: Bot,
+        job,
+        reply_markup: Optional[InlineKeyboardMarkup] = None,
+        workers: int = None,
+        exclude: set = None,
+    ):
+        self.bot = bot
+        self.job_id = job.id
+        self.admin_id = job.admin_id
+        self.text = job.text
+        self.lang = job.lang or DEFAULT_LANGUAGE
+        self.status_message_id = job.status_message_id
+        self.disable_notification = job.disable_notification
+        self.total = job.total
+        self.reply_markup = reply_markup
+        self.workers = workers or glv.config['BROADCAST_WORKERS']
+        self.exclude = set(exclude or ())
+        self.counters = {SENT: job.sent_count, BLOCKED: job.blocked_count, FAILED: job.failed_count}
+        self.cursor = job.cursor
+        self.retry_after_count = 0
+        self.cancelled = False
+        self._skip_ids: set = set()
+        self._issued: deque = deque()
+        self._completed: set = set()
+        self._pending_deliveries: list = []
+        self._flush_lock = asyncio.Lock()
+        self._running = asyncio.Event()
+        if job.status != JOB_PAUSED:
+            self._running.set()
+        self._last_progress_text = None
+
+    @property
+    def processed(self) -> int:
+        return sum(self.counters.values())
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self.cancelled = True
+        self._running.set()
+
+    async def _produce(self, queue: asyncio.Queue):
+        after_id = self.cursor
+        while not self.cancelled:
+            rows = await get_vpn_user_ids_page(after_id, RECIPIENTS_CHUNK_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                if self.cancelled:
+                    return
+                if row.tg_id is None or row.tg_id in self.exclude or row.id in self._skip_ids:
+                    continue
+                self._issued.append(row.id)
+                await queue.put((row.id, row.tg_id))
+            after_id = rows[-1].id
+            if len(rows) < RECIPIENTS_CHUNK_SIZE:
+                break
+
+    async def _send(self, tg_id: int) -> str:
+        for attempt in range(MAX_SEND_ATTEMPTS):
+            await telegram_bucket.acquire()
+            try:
+                await self.bot.send_message(
+                    tg_id,
+                    self.text,
+                    disable_web_page_preview=True,
+                    disable_notification=self.disable_notification,
+                    reply_markup=self.reply_markup
+                )
+                return SENT
+            except TelegramRetryAfter as e:
+                self.retry_after_count += 1
+                logging.warning(f"Broadcast #{self.job_id}: flood control, pausing sends for {e.retry_after}s")
+                telegram_bucket.pause(e.retry_after)
+            except TelegramForbiddenError:
+                return BLOCKED
+            except (TelegramNotFound, TelegramBadRequest) as e:
+                error_message = str(e).lower()
+                if "chat not found" in error_message or "user is deactivated" in error_message or isinstance(e, TelegramNotFound):
+                    return BLOCKED
+                logging.debug(f"Broadcast #{self.job_id}: failed to send to {tg_id}: {e}")
+                return FAILED
+            except Exception as e:
+                logging.debug(f"Broadcast #{self.job_id}: failed to send to {tg_id}: {e}")
+                return FAILED
+        return FAILED
+
+    def _advance_cursor(self, recipient_id: int):
+        self._completed.add(recipient_id)
+        while self._issued and self._issued[0] in self._completed:
+            self.cursor = self._issued.popleft()
+            self._completed.discard(self.cursor)
+
+    async def _flush(self):
+        async with self._flush_lock:
+            deliveries, self._pending_deliveries = self._pending_deliveries, []
+            try:
+                await save_broadcast_progress(
+                    self.job_id,
+                    deliveries,
+                    self.cursor,
+                    self.counters[SENT],
+                    self.counters[BLOCKED],
+                    self.counters[FAILED]
+                )
+            except BaseException as e:
+                self._pending_deliveries = deliveries + self._pending_deliveries
+                if not isinstance(e, Exception):
+                    raise
+                logging.error(f"Broadcast #{self.job_id}: failed to save progress: {e}", exc_info=True)
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                await self._running.wait()
+                if self.cancelled:
+                    continue
+                recipient_id, tg_id = item
+                status = await self._send(tg_id)
+                self.counters[status] += 1
+                self._pending_deliveries.append((recipient_id, tg_id, status))
+                self._advance_cursor(recipient_id)
+                if len(self._pending_deliveries) >= PROGRESS_FLUSH_SIZE:
+                    await self._flush()
+            finally:
+                queue.task_done()
+
+    def _string(self, key: str) -> str:
+        return get_i18n_string(key, self.lang)
+
+    def _progress_text(self) -> str:
+        key = "message_broadcast_paused_progress" if self.paused else "message_broadcast_progress"
+        return self._string(key).format(
+            processed=self.processed,
+            total=self.total,
+            success_count=self.counters[SENT],
+            blocked_count=self.counters[BLOCKED],
+            fail_count=self.counters[FAILED]
+        )
+
+    async def _edit_status(self, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None) -> bool:
+        if not self.status_message_id:
+            return False
+        try:
+            await self.bot.edit_message_text(
+                chat_id=self.admin_id,
+                message_id=self.status_message_id,
+                text=text,
+                reply_markup=reply_markup,
+            )
+            return True
+        except TelegramRetryAfter as e:
+            telegram_bucket.pause(e.retry_after)
+            return False
+        except Exception as e:
+            logging.debug(f"Broadcast #{self.job_id}: failed to update status message: {e}")
+            return False
+
+    async def _report_progress(self):
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            if self._pending_deliveries:
+                await self._flush()
+            text = self._progress_text()
+            if text != self._last_progress_text and await self._edit_status(text):
+                self._last_progress_text = text
+
+    async def _finish(self):
+        key = "message_broadcast_job_cancelled" if self.cancelled else "message_broadcast_completed"
+        completed_text = self._string(key).format(
+            success_count=self.counters[SENT],
+            blocked_count=self.counters[BLOCKED],
+            fail_count=self.counters[FAILED]
+        )
+        completed_markup = get_admin_management_keyboard(lang=self.lang)
+        if not await self._edit_status(completed_text, completed_markup):
+            await self.bot.send_message(self.admin_id, completed_text, reply_markup=completed_markup)
+
+    async def run(self) -> dict:
+        started = time.monotonic()
+        if self.cursor:
+            self._skip_ids = await get_broadcast_delivered_ids(self.job_id, self.cursor)
+            logging.info(f"Broadcast #{self.job_id}: resuming after recipient {self.cursor}, {self.processed} already processed")
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 10)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.workers)]
+        reporter = asyncio.create_task(self._report_progress())
+        try:
+            await self._produce(queue)
+            for worker in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            reporter.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(reporter, *workers, return_exceptions=True)
+            await self._flush()
+
+        status = JOB_CANCELLED if self.cancelled else JOB_COMPLETED
+        await update_broadcast_job_status(self.job_id, status)
+
+        elapsed = time.monotonic() - started
+        logging.info(
+            f"Broadcast #{self.job_id} by {self.admin_id} {status} in {elapsed:.1f}s: sent={self.counters[SENT]}, "
+            f"blocked={self.counters[BLOCKED]}, failed={self.counters[FAILED]}, retry_after={self.retry_after_count}"
+        )
+        await self._finish()
+        return dict(self.counters, elapsed=elapsed, status=status)
+
+_engines: dict = {}
+_tasks: set = set()
+
+async def _run_job(bot: Bot, job):
+    engine = BroadcastEngine(
+        bot=bot,
+        job=job,
+        reply_markup=get_broadcast_dismiss_keyboard(lang='ru'),
+        exclude=set(glv.config['ADMINS']),
+    )
+    _engines[job.id] = engine
+    try:
+        await engine.run()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logging.error(f"Broadcast #{job.id} by {job.admin_id} failed: {e}", exc_info=True)
+    finally:
+        _engines.pop(job.id, None)
+
+def _spawn(bot: Bot, job):
+    task = asyncio.create_task(_run_job(bot, job))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+async def start_broadcast(bot: Bot, admin_id: int, text: str, lang: str, status_message_id: int, disable_notification: bool = False) -> int:
+    total = max(0, await count_vpn_users() - len(glv.config['ADMINS']))
+    job_id = await create_broadcast_job(admin_id, text, lang, disable_notification, total, status_message_id)
+    _spawn(bot, await get_broadcast_job(job_id))
+    logging.info(f"Broadcast #{job_id} started by {admin_id} for ~{total} recipients")
+    return job_id
+
+async def resume_unfinished_broadcasts(bot: Bot):
+    for job in await get_broadcast_jobs_by_status([JOB_RUNNING]):
+        if job.id in _engines:
+            continue
+        logging.info(f"Broadcast #{job.id}: resuming after restart at recipient {job.cursor}")
+        _spawn(bot, job)
+
+async def get_active_broadcast():
+    jobs = await get_broadcast_jobs_by_status(list(JOB_ACTIVE_STATUSES))
+    return jobs[-1] if jobs else None
+
+async def pause_broadcast(job_id: int) -> bool:
+    if not await update_broadcast_job_status(job_id, JOB_PAUSED, from_statuses=[JOB_RUNNING]):
+        return False
+    engine = _engines.get(job_id)
+    if engine is not None:
+        engine.pause()
+        await engine._flush()
+    logging.info(f"Broadcast #{job_id} paused")
+    return True
+
+async def resume_broadcast(bot: Bot, job_id: int) -> bool:
+    if not await update_broadcast_job_status(job_id, JOB_RUNNING, from_statuses=[JOB_PAUSED]):
+        return False
+    engine = _engines.get(job_id)
+    if engine is not None:
+        engine.resume()
+    else:
+        _spawn(bot, await get_broadcast_job(job_id))
+    logging.info(f"Broadcast #{job_id} resumed")
+    return True
+
+async def cancel_broadcast(job_id: int) -> bool:
+    engine = _engines.get(job_id)
+    if engine is not None:
+        engine.cancel()
+        logging.info(f"Broadcast #{job_id} cancelling")
+        return True
+    if not await update_broadcast_job_status(job_id, JOB_CANCELLED, from_statuses=list(JOB_ACTIVE_STATUSES)):
+        return False
+    logging.info(f"Broadcast #{job_id} cancelled")
+    return True
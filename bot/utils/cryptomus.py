@@ -1,12 +1,86 @@
 import time
+import json
+import random
+import asyncio
 import hashlib
+import logging
 import aiohttp
 
 from db.methods import add_payment, get_user_promo_discount, PaymentPlatform
 from utils import goods
 from utils.webhook_data import get_sign
+import metrics
 import glv
 
+API_URL = "https://api.cryptomus.com"
+MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.3
+REQUEST_TIMEOUT = 15
+
+class CryptomusClient:
+    def __init__(self, base_url: str = API_URL, concurrency: int = None, max_attempts: int = MAX_ATTEMPTS, timeout: float = REQUEST_TIMEOUT):
+        self.base_url = base_url
+        self.concurrency = concurrency or glv.config['CRYPTOMUS_CONCURRENCY']
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.latency = metrics.LatencyHistogram()
+        self._session: aiohttp.ClientSession = None
+        self._semaphore: asyncio.Semaphore = None
+
+    async def start(self):
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(
+            base_url=self.base_url,
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout, sock_connect=5)
+        )
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def request(self, path: str, data: dict) -> dict:
+        if self._session is None or self._session.closed:
+            await self.start()
+
+        body = json.dumps(data)
+        headers = {
+            'merchant': glv.config['MERCHANT_UUID'],
+            'sign': get_sign(data, glv.config['CRYPTO_TOKEN']),
+            'Content-Type': 'application/json'
+        }
+        async with self._semaphore:
+            for attempt in range(self.max_attempts):
+                started = time.monotonic()
+                outcome = 'error'
+                try:
+                    async with self._session.post(path, data=body, headers=headers) as resp:
+                        outcome = str(resp.status)
+                        if 200 <= resp.status < 300:
+                            return (await resp.json())['result']
+                        error = Exception(f"Error: {resp.status}; Body: {await resp.text()}; Data: {data}")
+                        if resp.status < 500:
+                            raise error
+                except asyncio.TimeoutError:
+                    raise
+                except aiohttp.ClientConnectionError as e:
+                    error = e
+                finally:
+                    self.latency.observe(time.monotonic() - started, path=path, outcome=outcome)
+
+                if attempt == self.max_attempts - 1:
+                    raise error
+                delay = random.uniform(0, RETRY_BASE_DELAY * 2 ** attempt)
+                logging.warning(f"Cryptomus {path} attempt {attempt + 1}/{self.max_attempts} failed: {error}; retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+client = CryptomusClient()
+metrics.register('cryptomus_request_duration_seconds', 'Cryptomus API request latency', client.latency)
+
 async def create_payment(tg_id: int, callback: str, lang_code: str, amount_override: float = None) -> dict:
     target_callback = callback[len(goods.UPGRADE_PREFIX):] if callback.startswith(goods.UPGRADE_PREFIX) else callback
     good = goods.get(target_callback)
@@ -25,21 +99,13 @@ async def create_payment(tg_id: int, callback: str, lang_code: str, amount_overr
         "url_callback": glv.config['WEBHOOK_URL'] + "/cryptomus_payment",
         "is_payment_multiple": False
     }
-    headers = {
-        'merchant': glv.config['MERCHANT_UUID'],
-        'sign': get_sign(data, glv.config['CRYPTO_TOKEN']),
-        'Content-Type': 'application/json'
-    }
-    response = None
-    timeout = aiohttp.ClientTimeout(total=15)
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        async with session.post("https://api.cryptomus.com/v1/payment", json=data, headers=headers) as resp:
-            if 200 <= resp.status < 300:
-                response = (await resp.json())['result']
-            else:
-                raise Exception(f"Error: {resp.status}; Body: {await resp.text()}; Data: {data}")
+    response = await client.request("/v1/payment", data)
     return {
         "url": response['url'],
         "amount": response['amount'],
         "order_id": response['order_id']
     }
+
+async def get_payment_status(order_id: str) -> str:
+    response = await client.request("/v1/payment/info", {"order_id": order_id})
+    return response.get('payment_status') or response.get('status')
@@ -4,6 +4,9 @@ from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNotFound, TelegramServerError, TelegramRetryAfter
 from utils.lang import get_i18n_string
+from utils.rate_limit import telegram_bucket
+
+MAX_SEND_ATTEMPTS = 3
 
 class EphemeralNotification:
     
@@ -35,14 +38,21 @@ class EphemeralNotification:
                 new_buttons = existing_buttons + [dismiss_button]
                 reply_markup = InlineKeyboardMarkup(inline_keyboard=new_buttons)
             
-            msg = await bot.send_message(
-                chat_id=chat_id,
-                text=text,
-                reply_markup=reply_markup,
-                **kwargs
-            )
-            
-            return msg.message_id
+            for attempt in range(MAX_SEND_ATTEMPTS):
+                try:
+                    msg = await bot.send_message(
+                        chat_id=chat_id,
+                        text=text,
+                        reply_markup=reply_markup,
+                        **kwargs
+                    )
+                    return msg.message_id
+                except TelegramRetryAfter as e:
+                    if attempt == MAX_SEND_ATTEMPTS - 1:
+                        raise
+                    logging.warning(f"Flood control sending ephemeral notification to {chat_id}, pausing sends for {e.retry_after}s")
+                    telegram_bucket.pause(e.retry_after)
+                    await telegram_bucket.acquire()
             
         except TelegramBadRequest as e:
             error_message = str(e).lower()
@@ -0,0 +1,235 @@
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from db.methods import get_fsm_record, save_fsm_records
+from utils.keyed_lock import KeyedLock
+import glv
+
+def _build_key(key: StorageKey) -> str:
+    return ":".join(
+        str(part) if part is not None else ""
+        for part in (
+            key.bot_id,
+            key.chat_id,
+            key.user_id,
+            key.thread_id,
+            getattr(key, 'business_connection_id', None),
+            key.destiny,
+        )
+    )
+
+def _dump_data(data: dict) -> Optional[str]:
+    if not data:
+        return None
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+def _load_data(raw: Optional[str]) -> dict:
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except ValueError:
+        logging.warning("FSM storage: dropping unreadable data record")
+        return {}
+
+class _Record:
+    __slots__ = ('state', 'data')
+
+    def __init__(self, state: Optional[str] = None, data: Optional[dict] = None):
+        self.state = state
+        self.data = data or {}
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+class DBStorageBackend:
+    async def load(self, key: str):
+        row = await get_fsm_record(key)
+        if row is None:
+            return None
+        return row.state, row.data
+
+    async def save(self, upserts: list, deletes: list):
+        await save_fsm_records(upserts, deletes)
+
+    async def close(self):
+        pass
+
+class FileStorageBackend:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS fsm_storage (key TEXT PRIMARY KEY, state TEXT, data TEXT)")
+        self._conn.commit()
+
+    def _load(self, key: str):
+        with self._lock:
+            return self._conn.execute("SELECT state, data FROM fsm_storage WHERE key = ?", (key,)).fetchone()
+
+    def _save(self, upserts: list, deletes: list):
+        with self._lock, self._conn:
+            if upserts:
+                self._conn.executemany("INSERT OR REPLACE INTO fsm_storage (key, state, data) VALUES (?, ?, ?)", upserts)
+            if deletes:
+                self._conn.executemany("DELETE FROM fsm_storage WHERE key = ?", [(key,) for key in deletes])
+
+    async def load(self, key: str):
+        return await asyncio.to_thread(self._load, key)
+
+    async def save(self, upserts: list, deletes: list):
+        await asyncio.to_thread(self._save, upserts, deletes)
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+class PersistentStorage(BaseStorage):
+    def __init__(self, backend, cache_size: int = 10000, flush_interval: float = 0.5, flush_batch_size: int = 200):
+        self.backend = backend
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self._hot: OrderedDict = OrderedDict()
+        self._dirty: Dict[str, _Record] = {}
+        self._key_lock = KeyedLock()
+        self._flush_lock = asyncio.Lock()
+        self._flush_wakeup = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def _remember(self, key: str, record: _Record):
+        self._hot[key] = record
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.cache_size:
+            self._hot.popitem(last=False)
+
+    async def _get_record(self, key: str) -> _Record:
+        record = self._hot.get(key)
+        if record is not None:
+            self._hot.move_to_end(key)
+            return record
+
+        record = self._dirty.get(key)
+        if record is None:
+            row = await self.backend.load(key)
+            record = _Record(row[0], _load_data(row[1])) if row is not None else _Record()
+        self._remember(key, record)
+        return record
+
+    def _mark_dirty(self, key: str, record: _Record):
+        self._dirty[key] = record
+        if self._flusher is None and not self._closed:
+            self._flusher = asyncio.create_task(self._flush_loop())
+        if len(self._dirty) >= self.flush_batch_size:
+            self._flush_wakeup.set()
+
+    async def _flush_loop(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+            upserts = []
+            deletes = []
+            for key, record in dirty.items():
+                if record.empty:
+                    deletes.append(key)
+                else:
+                    upserts.append((key, record.state, _dump_data(record.data)))
+            started = time.monotonic()
+            try:
+                await self.backend.save(upserts, deletes)
+            except BaseException as e:
+                for key, record in dirty.items():
+                    self._dirty.setdefault(key, record)
+                if not isinstance(e, Exception):
+                    raise
+                logging.error(f"FSM storage: failed to flush {len(dirty)} record(s): {e}", exc_info=True)
+                return
+            logging.debug(f"FSM storage: flushed {len(upserts)} upsert(s), {len(deletes)} delete(s) in {time.monotonic() - started:.3f}s")
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = _build_key(key)
+        async with self._key_lock(storage_key):
+            record = await self._get_record(storage_key)
+            record.state = state.state if isinstance(state, State) else state
+            self._mark_dirty(storage_key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        storage_key = _build_key(key)
+        async with self._key_lock(storage_key):
+            return (await self._get_record(storage_key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = _build_key(key)
+        async with self._key_lock(storage_key):
+            record = await self._get_record(storage_key)
+            data = data.copy()
+            _dump_data(data)
+            record.data = data
+            self._mark_dirty(storage_key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        storage_key = _build_key(key)
+        async with self._key_lock(storage_key):
+            return (await self._get_record(storage_key)).data.copy()
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        storage_key = _build_key(key)
+        async with self._key_lock(storage_key):
+            record = await self._get_record(storage_key)
+            data = {**record.data, **data}
+            _dump_data(data)
+            record.data = data
+            self._mark_dirty(storage_key, record)
+            return record.data.copy()
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._flusher is not None:
+            self._flush_wakeup.set()
+            await self._flusher
+        await self.flush()
+        await self.backend.close()
+
+def create_storage() -> BaseStorage:
+    kind = glv.config['FSM_STORAGE']
+    if kind == 'db':
+        backend = DBStorageBackend()
+    elif kind == 'file':
+        backend = FileStorageBackend(glv.config['FSM_STORAGE_PATH'])
+    else:
+        if kind != 'memory':
+            logging.warning(f"Unknown FSM_STORAGE '{kind}', falling back to memory")
+        return MemoryStorage()
+
+    logging.info(f"FSM storage: using '{kind}' backend with write-behind flushing every {glv.config['FSM_FLUSH_INTERVAL']}s")
+    return PersistentStorage(
+        backend,
+        cache_size=glv.config['FSM_CACHE_SIZE'],
+        flush_interval=glv.config['FSM_FLUSH_INTERVAL'],
+    )
@@ -1,27 +1,138 @@
+import os
 import json
+import time
+import bisect
+import logging
+import threading
+
+GOODS_PATH = "goods.json"
+RELOAD_CHECK_INTERVAL = 5.0
+
+UPGRADE_PREFIX = "upgrade_"
+
+class Catalog:
+    def __init__(self, path: str = GOODS_PATH, check_interval: float = RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._items = []
+        self._callbacks = []
+        self._callbacks_set = frozenset()
+        self._by_callback = {}
+        self._by_type = {}
+        self._by_type_months = {}
+        self._renew_limits = {}
+
+    def _build(self, data: list):
+        by_callback = {}
+        by_type = {}
+        by_type_months = {}
+        renew_by_months = {}
+        for good in data:
+            by_callback.setdefault(good['callback'], good)
+            by_type.setdefault(good.get('type'), []).append(good)
+            by_type_months.setdefault((good.get('type'), good.get('months')), []).append(good)
+            if good.get('type') == 'renew':
+                renew_by_months.setdefault(good['months'], []).append(good)
+
+        renew_limits = {}
+        for months, options in renew_by_months.items():
+            options = sorted(options, key=lambda good: good['data_limit'])
+            renew_limits[months] = ([good['data_limit'] for good in options], options)
+
+        self._items = data
+        self._callbacks = [good['callback'] for good in data]
+        self._callbacks_set = frozenset(self._callbacks)
+        self._by_callback = by_callback
+        self._by_type = by_type
+        self._by_type_months = by_type_months
+        self._renew_limits = renew_limits
+
+    def _ensure_loaded(self):
+        now = time.monotonic()
+        if self._mtime is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._mtime is not None and now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                if self._mtime is None:
+                    raise
+                logging.warning(f"Goods file {self.path} is not accessible, keeping cached catalog")
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path) as file:
+                    data = json.load(file)
+            except (OSError, ValueError) as e:
+                if self._mtime is None:
+                    raise
+                logging.error(f"Failed to reload goods from {self.path}, keeping cached catalog: {e}")
+                return
+            self._build(data)
+            if self._mtime is not None:
+                logging.info(f"Goods catalog reloaded from {self.path}: {len(data)} item(s)")
+            self._mtime = mtime
+
+    def reload(self):
+        with self._lock:
+            self._mtime = None
+            self._checked_at = 0.0
+        self._ensure_loaded()
+
+    def all(self) -> list:
+        self._ensure_loaded()
+        return self._items
+
+    def by_callback(self, callback: str) -> dict:
+        self._ensure_loaded()
+        return self._by_callback.get(callback, dict())
+
+    def callbacks(self) -> list:
+        self._ensure_loaded()
+        return self._callbacks
+
+    def has_callback(self, callback: str) -> bool:
+        self._ensure_loaded()
+        return callback in self._callbacks_set
+
+    def by_type(self, good_type: str, months: int = None) -> list:
+        self._ensure_loaded()
+        if months is None:
+            return self._by_type.get(good_type, [])
+        return self._by_type_months.get((good_type, months), [])
+
+    def renew_options_above(self, months: int, data_limit: int) -> list:
+        self._ensure_loaded()
+        limits, options = self._renew_limits.get(months, ([], []))
+        return options[bisect.bisect_right(limits, data_limit):]
+
+catalog = Catalog()
 
 def get(callback=None) -> list | dict:
-    with open("goods.json") as file:
-        data = json.load(file)
     if callback is None:
-        return data
-    for v in data:
-        if v['callback'] == callback:
-            return v
-    return dict()
+        return catalog.all()
+    return catalog.by_callback(callback)
 
 def get_callbacks() -> list:
-    with open("goods.json") as file:
-        data = json.load(file)
-    res = [x['callback'] for x in data]
-    return res
+    return catalog.callbacks()
 
-UPGRADE_PREFIX = "upgrade_"
+def has_callback(callback: str) -> bool:
+    return catalog.has_callback(callback)
+
+def get_by_type(good_type: str, months: int = None) -> list:
+    return catalog.by_type(good_type, months)
 
 def get_current_tariff(callbacks: list) -> dict:
     for cb in callbacks:
         target = cb[len(UPGRADE_PREFIX):] if cb.startswith(UPGRADE_PREFIX) else cb
-        good = get(target)
+        good = catalog.by_callback(target)
         if good and good.get("type") == "renew":
             return good
     return dict()
@@ -29,13 +140,7 @@ def get_current_tariff(callbacks: list) -> dict:
 def get_upgrade_options(current: dict) -> list:
     if not current:
         return []
-    options = [
-        good for good in get()
-        if good.get("type") == "renew"
-        and good["months"] == current["months"]
-        and good["data_limit"] > current["data_limit"]
-    ]
-    return sorted(options, key=lambda good: good["data_limit"])
+    return catalog.renew_options_above(current["months"], current["data_limit"])
 
 def get_upgrade_price(current: dict, target: dict, currency: str):
-    return target["price"][currency] - current["price"][currency]
\ No newline at end of file
+    return target["price"][currency] - current["price"][currency]
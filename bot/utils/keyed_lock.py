@@ -0,0 +1,24 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Hashable
+
+class KeyedLock:
+    def __init__(self):
+        self._locks: dict = {}
+
+    @asynccontextmanager
+    async def __call__(self, key: Hashable):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._locks)
@@ -1,15 +1,71 @@
-import gettext 
+import os
+import gettext
+import logging
+import threading
 from pathlib import Path
 
 domain = 'bot'
-localedir = 'locales'
+localedir = Path(__file__).parent.parent / 'locales'
+
+SUPPORTED_LANGUAGES = ('en', 'ru')
+DEFAULT_LANGUAGE = 'en'
+
+_translations: dict = {}
+_mtimes: dict = {}
+_lock = threading.Lock()
+
+def _mo_path(lang: str) -> Path:
+    return localedir / lang / 'LC_MESSAGES' / f'{domain}.mo'
+
+def _mo_mtime(lang: str):
+    try:
+        return os.stat(_mo_path(lang)).st_mtime_ns
+    except OSError:
+        return None
+
+def _load(lang: str) -> gettext.NullTranslations:
+    path = _mo_path(lang)
+    try:
+        with open(path, 'rb') as file:
+            return gettext.GNUTranslations(file)
+    except OSError as e:
+        logging.warning(f"No translations for '{lang}' at {path}, falling back to message ids: {e}")
+        return gettext.NullTranslations()
+
+def _resolve_language(lang) -> str:
+    return lang if lang in SUPPORTED_LANGUAGES else DEFAULT_LANGUAGE
+
+def load_translations():
+    with _lock:
+        for lang in SUPPORTED_LANGUAGES:
+            _mtimes[lang] = _mo_mtime(lang)
+            _translations[lang] = _load(lang)
+    logging.info(f"Translations loaded: {', '.join(SUPPORTED_LANGUAGES)}")
+
+def reload_translations_if_changed() -> bool:
+    reloaded = False
+    with _lock:
+        for lang in SUPPORTED_LANGUAGES:
+            mtime = _mo_mtime(lang)
+            if lang in _translations and mtime == _mtimes.get(lang):
+                continue
+            _mtimes[lang] = mtime
+            _translations[lang] = _load(lang)
+            reloaded = True
+    if reloaded:
+        logging.info("Translations reloaded from locales directory")
+    return reloaded
+
+def get_translation(lang) -> gettext.NullTranslations:
+    lang = _resolve_language(lang)
+    translation = _translations.get(lang)
+    if translation is None:
+        with _lock:
+            translation = _translations.get(lang)
+            if translation is None:
+                _mtimes[lang] = _mo_mtime(lang)
+                translation = _translations[lang] = _load(lang)
+    return translation
 
 def get_i18n_string(s, lang) -> str:
-    if lang in ['ru']:
-        language_translations = gettext.translation(domain, Path(__file__).parent.parent / localedir, languages=[lang])
-        language_translations.install()
-        return _(s)
-    language_translations = gettext.translation(domain, localedir, languages=['en'])
-    language_translations.install()
-    
-    return _(s)
\ No newline at end of file
+    return get_translation(lang).gettext(s)
@@ -8,13 +8,12 @@ from aiogram.types import InlineKeyboardMarkup, Message
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNotFound
 
 from .telegram_message import safe_edit_or_send
+from .message_writer import user_message_writer
 
-from db.methods import (
-    save_user_message,
-    get_user_messages,
-    delete_user_message
-)
-from sqlalchemy.exc import OperationalError
+from db.methods import get_user_messages
+
+
+DELETE_MESSAGES_LIMIT = 100
 
 
 class MessageType(Enum):
@@ -45,29 +44,24 @@ class MessageCleanup:
     async def _get_messages_state(self, chat_id: Optional[int] = None) -> dict:
         data = await self.state.get_data()
         messages = data.get('messages')
+        loaded_from_db = False
         
         if messages is None and chat_id is not None:
-            for attempt in range(3):
-                try:
-                    tg_id = await self._get_tg_id(chat_id)
-                    db_messages = await get_user_messages(tg_id)
-                    if db_messages and any(db_messages.values()):
-                        messages = db_messages
-                        await self.state.update_data(messages=messages)
-                        if self.debug:
-                            msg_count = sum(1 for m in messages.values() if m)
-                            logging.info(f"Cleanup: loaded {msg_count} messages from DB for user {tg_id}")
-                    break
-                except OperationalError:
-                    if attempt == 2:
-                        if self.debug:
-                            logging.warning(f"Cleanup: failed to load messages from DB after 3 attempts")
-                        break
-                    await asyncio.sleep(0.5 * (attempt + 1))
-                except Exception as e:
+            try:
+                tg_id = await self._get_tg_id(chat_id)
+                if user_message_writer.has_pending(tg_id):
+                    await user_message_writer.flush()
+                db_messages = await get_user_messages(tg_id)
+                loaded_from_db = True
+                if db_messages and any(db_messages.values()):
+                    messages = db_messages
+                    await self.state.update_data(messages=messages)
                     if self.debug:
-                        logging.warning(f"Cleanup: failed to load messages from DB: {e}")
-                    break
+                        msg_count = sum(1 for m in messages.values() if m)
+                        logging.info(f"Cleanup: loaded {msg_count} messages from DB for user {tg_id}")
+            except Exception as e:
+                if self.debug:
+                    logging.warning(f"Cleanup: failed to load messages from DB: {e}")
         
         if messages is None:
             messages = {
@@ -78,6 +72,8 @@ class MessageCleanup:
                 'success': None,
                 'important': None
             }
+            if loaded_from_db:
+                await self.state.update_data(messages=messages)
         
         return messages
 
@@ -96,6 +92,8 @@ class MessageCleanup:
     async def sync_from_db(self, chat_id: int):
         try:
             tg_id = await self._get_tg_id(chat_id)
+            if user_message_writer.has_pending(tg_id):
+                await user_message_writer.flush()
             db_messages = await get_user_messages(tg_id)
             
             if self.debug:
@@ -168,31 +166,52 @@ class MessageCleanup:
         
         if deleted_from_telegram and message_type:
             tg_id = await self._get_tg_id(chat_id)
-            for attempt in range(3):
-                try:
-                    await delete_user_message(tg_id, message_id, message_type)
-                    if self.debug:
-                        logging.info(f"Cleanup: deleted {message_type} message {message_id} from DB for user {tg_id}")
-                    break
-                except OperationalError:
-                    if attempt == 2:
-                        if self.debug:
-                            logging.warning(f"Cleanup: failed to delete message {message_id} from DB after 3 attempts")
-                        break
-                    await asyncio.sleep(0.5 * (attempt + 1))
-                except Exception as e:
-                    if self.debug:
-                        logging.warning(f"Cleanup: failed to delete message {message_id} from DB: {e}")
-                    break
+            user_message_writer.remove(tg_id, message_id, message_type)
+            if self.debug:
+                logging.info(f"Cleanup: queued removal of {message_type} message {message_id} for user {tg_id}")
         
         return deleted_from_telegram
 
+    async def _delete_batch(self, chat_id: int, items: List[tuple]) -> int:
+        items = [(msg_id, msg_type) for msg_id, msg_type in items if isinstance(msg_id, int) and msg_id > 0]
+        if not items:
+            return 0
+
+        deleted_count = 0
+        fallback = []
+        for offset in range(0, len(items), DELETE_MESSAGES_LIMIT):
+            chunk = items[offset:offset + DELETE_MESSAGES_LIMIT]
+            try:
+                await asyncio.wait_for(
+                    self.bot.delete_messages(chat_id, [msg_id for msg_id, _ in chunk]),
+                    timeout=10.0
+                )
+            except Exception as e:
+                if self.debug:
+                    logging.warning(f"Cleanup: bulk delete of {len(chunk)} message(s) in chat {chat_id} failed, falling back to single deletes: {e}")
+                fallback.extend(chunk)
+                continue
+
+            deleted_count += len(chunk)
+            tg_id = await self._get_tg_id(chat_id)
+            user_message_writer.remove_many(tg_id, [(msg_id, msg_type) for msg_id, msg_type in chunk if msg_type])
+            if self.debug:
+                logging.info(f"Cleanup: bulk deleted {len(chunk)} message(s) in chat {chat_id}")
+
+        if fallback:
+            results = await asyncio.gather(
+                *(self._delete_message(chat_id, msg_id, msg_type) for msg_id, msg_type in fallback),
+                return_exceptions=True
+            )
+            deleted_count += sum(1 for result in results if result is True)
+
+        return deleted_count
+
     async def _delete_messages(self, chat_id: int, message_ids: List[int], message_type: Optional[str] = None):
         if not message_ids:
             return
         
-        tasks = [self._delete_message(chat_id, msg_id, message_type) for msg_id in message_ids if msg_id]
-        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._delete_batch(chat_id, [(msg_id, message_type) for msg_id in message_ids if msg_id])
 
     async def register_message(self, chat_id: int, message_id: int, message_type: MessageType):
         if not message_id or not isinstance(message_id, int) or message_id <= 0:
@@ -213,42 +232,16 @@ class MessageCleanup:
             else:
                 old_message_id = messages.get(message_type.value)
                 if old_message_id and old_message_id != message_id:
-                    for attempt in range(3):
-                        try:
-                            await delete_user_message(tg_id, old_message_id, message_type.value)
-                            if self.debug:
-                                logging.info(f"Cleanup: deleted old {message_type.value} message {old_message_id} from DB for user {tg_id}")
-                            break
-                        except OperationalError:
-                            if attempt == 2:
-                                if self.debug:
-                                    logging.warning(f"Cleanup: failed to delete old message {old_message_id} from DB after 3 attempts")
-                                break
-                            await asyncio.sleep(0.5 * (attempt + 1))
-                        except Exception as e:
-                            if self.debug:
-                                logging.warning(f"Cleanup: failed to delete old message {old_message_id} from DB: {e}")
-                            break
+                    user_message_writer.remove(tg_id, old_message_id, message_type.value)
+                    if self.debug:
+                        logging.info(f"Cleanup: queued removal of old {message_type.value} message {old_message_id} for user {tg_id}")
                 messages[message_type.value] = message_id
             
             await self._save_messages_state(messages)
             
-            for attempt in range(3):
-                try:
-                    await save_user_message(tg_id, message_id, message_type.value)
-                    if self.debug:
-                        logging.info(f"Cleanup: saved {message_type.value} message {message_id} to DB for user {tg_id}")
-                    break
-                except OperationalError:
-                    if attempt == 2:
-                        if self.debug:
-                            logging.warning(f"Cleanup: failed to save message {message_id} to DB after 3 attempts")
-                        break
-                    await asyncio.sleep(0.5 * (attempt + 1))
-                except Exception as e:
-                    if self.debug:
-                        logging.warning(f"Cleanup: failed to save message {message_id} to DB: {e}")
-                    break
+            user_message_writer.add(tg_id, message_id, message_type.value)
+            if self.debug:
+                logging.info(f"Cleanup: queued {message_type.value} message {message_id} for user {tg_id}")
         except Exception as e:
             if self.debug:
                 logging.warning(f"Cleanup: failed to register message {message_id}: {e}")
@@ -273,7 +266,7 @@ class MessageCleanup:
         if self.debug:
             logging.info(f"Cleanup: event '{event}' - deleting types {[t.value for t in types_to_delete]}" + (f" (except {except_message_id})" if except_message_id else ""))
         
-        deleted_count = 0
+        to_delete = []
         for msg_type in types_to_delete:
             type_key = msg_type.value
             
@@ -283,16 +276,15 @@ class MessageCleanup:
             if isinstance(messages[type_key], list):
                 if messages[type_key]:
                     message_ids_to_delete = [msg_id for msg_id in messages[type_key] if msg_id != except_message_id] if except_message_id else messages[type_key]
-                    if message_ids_to_delete:
-                        await self._delete_messages(chat_id, message_ids_to_delete, type_key)
-                        deleted_count += len(message_ids_to_delete)
+                    to_delete.extend((msg_id, type_key) for msg_id in message_ids_to_delete)
                     messages[type_key] = [msg_id for msg_id in messages[type_key] if msg_id == except_message_id] if except_message_id else []
             elif messages[type_key] is not None:
                 if messages[type_key] != except_message_id:
-                    if await self._delete_message(chat_id, messages[type_key], type_key):
-                        deleted_count += 1
+                    to_delete.append((messages[type_key], type_key))
                     messages[type_key] = None
         
+        deleted_count = await self._delete_batch(chat_id, to_delete)
+        
         await self._save_messages_state(messages)
         
         if self.debug:
@@ -312,23 +304,22 @@ class MessageCleanup:
                 logging.debug(f"Cleanup: no messages to delete for chat {chat_id}")
             return
         
-        deleted_count = 0
-        
+        to_delete = []
         for type_key, message_data in messages.items():
             if isinstance(message_data, list):
                 if message_data:
                     if self.debug:
                         logging.info(f"Cleanup: deleting {len(message_data)} {type_key} message(s): {message_data}")
-                    await self._delete_messages(chat_id, message_data, type_key)
-                    deleted_count += len(message_data)
+                    to_delete.extend((msg_id, type_key) for msg_id in message_data)
                     messages[type_key] = []
             elif message_data is not None:
                 if self.debug:
                     logging.info(f"Cleanup: deleting {type_key} message: {message_data}")
-                if await self._delete_message(chat_id, message_data, type_key):
-                    deleted_count += 1
+                to_delete.append((message_data, type_key))
                 messages[type_key] = None
         
+        deleted_count = await self._delete_batch(chat_id, to_delete)
+        
         await self._save_messages_state(messages)
         
         if self.debug:
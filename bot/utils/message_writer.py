@@ -0,0 +1,113 @@
+import time
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy.exc import OperationalError
+
+from db.methods import apply_user_message_changes
+import resilience
+import glv
+
+ADD = 'add'
+REMOVE = 'remove'
+FLUSH_RETRY = resilience.RetryPolicy(attempts=3, base_delay=0.5, retry_on=(OperationalError,))
+MAX_PENDING_CHANGES = 50000
+
+class UserMessageWriter:
+    def __init__(self, flush_interval: float = 0.3, flush_batch_size: int = 200):
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self._pending: dict = {}
+        self._pending_count = 0
+        self._in_flight: dict = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_wakeup = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def _queue(self, tg_id: int, message_id: int, message_type: str, op: str):
+        user_ops = self._pending.setdefault(tg_id, {})
+        key = (message_id, message_type)
+        if key not in user_ops:
+            self._pending_count += 1
+        user_ops[key] = op
+
+        if self._flusher is None and not self._closed:
+            self._flusher = asyncio.create_task(self._flush_loop())
+        if self._pending_count >= self.flush_batch_size:
+            self._flush_wakeup.set()
+
+    def add(self, tg_id: int, message_id: int, message_type: str):
+        self._queue(tg_id, message_id, message_type, ADD)
+
+    def remove(self, tg_id: int, message_id: int, message_type: str):
+        self._queue(tg_id, message_id, message_type, REMOVE)
+
+    def remove_many(self, tg_id: int, messages: list):
+        for message_id, message_type in messages:
+            self._queue(tg_id, message_id, message_type, REMOVE)
+
+    def has_pending(self, tg_id: int) -> bool:
+        return tg_id in self._pending or tg_id in self._in_flight
+
+    def _restore(self, pending: dict):
+        for tg_id, user_ops in pending.items():
+            current = self._pending.setdefault(tg_id, {})
+            for key, op in user_ops.items():
+                if key not in current:
+                    current[key] = op
+                    self._pending_count += 1
+
+    async def _flush_loop(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            self._pending_count = 0
+            self._in_flight = pending
+
+            added = []
+            removed = []
+            for tg_id, user_ops in pending.items():
+                for (message_id, message_type), op in user_ops.items():
+                    (added if op == ADD else removed).append((tg_id, message_id, message_type))
+
+            started = time.monotonic()
+            try:
+                await FLUSH_RETRY.call(apply_user_message_changes, added, removed)
+            except Exception as e:
+                if self._pending_count + len(added) + len(removed) > MAX_PENDING_CHANGES:
+                    logging.error(f"Cleanup: failed to flush {len(added) + len(removed)} message change(s), dropping them, {self._pending_count} still queued: {e}")
+                    return
+                self._restore(pending)
+                logging.warning(f"Cleanup: failed to flush {len(added) + len(removed)} message change(s), keeping them for the next flush: {e}")
+                return
+            except BaseException:
+                self._restore(pending)
+                raise
+            finally:
+                self._in_flight = {}
+
+            if glv.MESSAGE_CLEANUP_DEBUG:
+                logging.info(f"Cleanup: flushed {len(added)} added and {len(removed)} removed message(s) for {len(pending)} user(s) in {time.monotonic() - started:.3f}s")
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._flusher is not None:
+            self._flush_wakeup.set()
+            await self._flusher
+        await self.flush()
+
+user_message_writer = UserMessageWriter(glv.config['MESSAGE_FLUSH_INTERVAL'], glv.config['MESSAGE_FLUSH_BATCH_SIZE'])
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from db.methods import get_marzban_profiles_by_vpn_ids
+from panel import get_panel
+import glv
+
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+CLOSE_TIMEOUT = 10.0
+
+class NotificationQueue:
+    def __init__(self, handler: Callable[[dict, object], Awaitable[None]], workers: int = None, capacity: int = None, batch_size: int = 100):
+        self.handler = handler
+        self.workers = workers or glv.config['NOTIFY_WORKERS']
+        self.capacity = capacity or glv.config['NOTIFY_QUEUE_SIZE']
+        self.batch_size = batch_size
+        self._pending: OrderedDict = OrderedDict()
+        self._work: Optional[asyncio.Queue] = None
+        self._wakeup = asyncio.Event()
+        self._tasks: list = []
+        self._dispatching = False
+        self._closing = False
+        self.coalesced = 0
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        return len(self._pending) + (self._work.qsize() if self._work is not None else 0)
+
+    def offer(self, vpn_id: str, event: str, payload: dict) -> bool:
+        key = (vpn_id, event)
+        if key in self._pending:
+            self._pending[key] = payload
+            self.coalesced += 1
+            return True
+        if not self._tasks or self._closing or len(self) >= self.capacity:
+            self.rejected += 1
+            return False
+        self._pending[key] = payload
+        self._wakeup.set()
+        return True
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._work = asyncio.Queue(maxsize=self.workers * 2)
+        self._tasks = [asyncio.create_task(self._dispatch())]
+        self._tasks.extend(asyncio.create_task(self._worker()) for _ in range(self.workers))
+        logging.info(f"Notification queue started with {self.workers} worker(s), capacity {self.capacity}")
+
+    async def close(self, timeout: float = CLOSE_TIMEOUT):
+        if not self._tasks:
+            return
+        self._closing = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._drain(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._closing = False
+        if len(self):
+            logging.warning(f"Notification queue: dropped {len(self)} event(s) still queued after {timeout}s on shutdown")
+            self._pending.clear()
+
+    async def _drain(self):
+        while self._pending or self._dispatching:
+            await asyncio.sleep(0.05)
+        await self._work.join()
+
+    def _restore(self, batch: list):
+        for key, payload in reversed(batch):
+            if key not in self._pending:
+                self._pending[key] = payload
+            self._pending.move_to_end(key, last=False)
+
+    async def _dispatch(self):
+        delay = RETRY_BASE_DELAY
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            while self._pending:
+                batch = []
+                while self._pending and len(batch) < self.batch_size:
+                    batch.append(self._pending.popitem(last=False))
+
+                self._dispatching = True
+                try:
+                    try:
+                        users = await get_marzban_profiles_by_vpn_ids(list({vpn_id for (vpn_id, _), _ in batch}))
+                    except Exception as e:
+                        self._restore(batch)
+                        logging.error(f"Notification queue: failed to look up {len(batch)} event(s), retrying in {delay:.0f}s: {e}")
+                        await asyncio.sleep(delay)
+                        delay = min(delay * 2, RETRY_MAX_DELAY)
+                        continue
+                    delay = RETRY_BASE_DELAY
+
+                    panel = get_panel()
+                    for (vpn_id, event), payload in batch:
+                        user = users.get(vpn_id)
+                        if user is None:
+                            logging.info(f"No user found id={vpn_id}")
+                            continue
+                        panel.invalidate_panel_user(tg_id=user.tg_id, username=vpn_id)
+                        await self._work.put((payload, user))
+                finally:
+                    self._dispatching = False
+
+    async def _worker(self):
+        while True:
+            payload, user = await self._work.get()
+            try:
+                await self.handler(payload, user)
+            except Exception as e:
+                logging.error(f"Notification queue: {payload.get('event')} for user {user.tg_id} failed: {e}", exc_info=True)
+            finally:
+                self._work.task_done()
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from db.methods import (
+    get_pending_payment_inbox_events,
+    claim_payment_inbox_event,
+    finish_payment_inbox_event,
+    requeue_interrupted_payment_inbox_events,
+)
+from db.user_context import open_user_context, close_user_context
+from utils.keyed_lock import KeyedLock
+import glv
+
+POLL_INTERVAL = 5.0
+RETRY_BASE_DELAY = 30.0
+RETRY_MAX_DELAY = 1800.0
+
+PAYMENT_EVENT_PAID = 'paid'
+PAYMENT_EVENT_CANCEL = 'cancel'
+
+class PaymentInboxWorker:
+    def __init__(self, handler: Callable[[object], Awaitable[None]], workers: int = None, poll_interval: float = POLL_INTERVAL):
+        self.handler = handler
+        self.workers = workers or glv.config['PAYMENT_WORKERS']
+        self.poll_interval = poll_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: set = set()
+        self._user_lock = KeyedLock()
+        self._wakeup = asyncio.Event()
+        self._tasks: list = []
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def start(self):
+        if self._tasks:
+            return
+        interrupted = await requeue_interrupted_payment_inbox_events()
+        if interrupted:
+            logging.warning(f"Payment inbox: {interrupted} event(s) were interrupted mid-processing and requeued")
+
+        self._queue = asyncio.Queue(maxsize=self.workers * 10)
+        self._tasks = [asyncio.create_task(self._dispatch())]
+        self._tasks.extend(asyncio.create_task(self._worker()) for _ in range(self.workers))
+        logging.info(f"Payment inbox started with {self.workers} worker(s)")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _dispatch(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                events = await get_pending_payment_inbox_events(limit=self.workers * 10)
+            except Exception as e:
+                logging.error(f"Payment inbox: failed to load pending events: {e}", exc_info=True)
+                continue
+
+            for event in events:
+                if event.id in self._queued:
+                    continue
+                self._queued.add(event.id)
+                await self._queue.put(event)
+
+    async def _worker(self):
+        while True:
+            event = await self._queue.get()
+            try:
+                async with self._user_lock(event.tg_id):
+                    await self._process(event)
+            finally:
+                self._queued.discard(event.id)
+                self._queue.task_done()
+
+    async def _process(self, event):
+        try:
+            if not await claim_payment_inbox_event(event.id):
+                return
+        except Exception as e:
+            logging.error(f"Payment inbox: failed to claim event {event.id}: {e}", exc_info=True)
+            return
+
+        status, error, retry_at = 'done', None, None
+        attempts = event.attempts + 1
+        token = open_user_context(event.tg_id)
+        try:
+            await self.handler(event)
+        except Exception as e:
+            error = str(e)
+            if attempts < glv.config['PAYMENT_MAX_ATTEMPTS']:
+                delay = min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+                status, retry_at = 'pending', datetime.now() + timedelta(seconds=delay)
+                logging.error(f"Payment inbox: {event.event} event for payment {event.payment_id} failed (attempt {attempts}), retrying in {delay:.0f}s: {e}", exc_info=True)
+            else:
+                status = 'failed'
+                logging.error(f"Payment inbox: {event.event} event for payment {event.payment_id} failed after {attempts} attempt(s), giving up until the provider redelivers it: {e}", exc_info=True)
+        finally:
+            close_user_context(token)
+
+        try:
+            await finish_payment_inbox_event(event.id, status, error, retry_at)
+        except Exception as e:
+            logging.error(f"Payment inbox: failed to mark event {event.id} as {status}: {e}", exc_info=True)
+            return
+        logging.info(f"Payment inbox: {event.event} event for payment {event.payment_id} of user {event.tg_id} {status}")
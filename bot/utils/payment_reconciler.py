@@ -0,0 +1,117 @@
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Callable
+
+from db.methods import get_unreconciled_payments_page, add_payment_inbox_event, PaymentPlatform
+from utils import yookassa, cryptomus
+from utils.payment_inbox import PAYMENT_EVENT_PAID, PAYMENT_EVENT_CANCEL
+import glv
+
+PAGE_SIZE = 200
+MIN_PAYMENT_AGE = timedelta(minutes=5)
+
+STATUS_EVENTS = {
+    PaymentPlatform.YOOKASSA: {
+        'succeeded': PAYMENT_EVENT_PAID,
+        'canceled': PAYMENT_EVENT_CANCEL,
+    },
+    PaymentPlatform.CRYPTOMUS: {
+        'paid': PAYMENT_EVENT_PAID,
+        'paid_over': PAYMENT_EVENT_PAID,
+        'cancel': PAYMENT_EVENT_CANCEL,
+    },
+}
+
+async def _fetch_status(platform: PaymentPlatform, payment_id: str) -> str:
+    if platform == PaymentPlatform.YOOKASSA:
+        return await yookassa.get_payment_status(payment_id)
+    return await cryptomus.get_payment_status(payment_id)
+
+async def reconcile_payments(max_age_hours: int = None, concurrency: int = None) -> dict:
+    max_age_hours = max_age_hours or glv.config['PAYMENT_RECONCILE_MAX_AGE_HOURS']
+    concurrency = concurrency or glv.config['PAYMENT_RECONCILE_CONCURRENCY']
+
+    platforms = []
+    if glv.config['YOOKASSA_SHOPID'] and glv.config['YOOKASSA_TOKEN']:
+        platforms.append(PaymentPlatform.YOOKASSA)
+    if glv.config['CRYPTO_PAYMENT_ENABLED']:
+        platforms.append(PaymentPlatform.CRYPTOMUS)
+    if not platforms:
+        return {'checked': 0, PAYMENT_EVENT_PAID: 0, PAYMENT_EVENT_CANCEL: 0, 'errors': 0}
+
+    started = time.monotonic()
+    now = datetime.now()
+    since = now - timedelta(hours=max_age_hours)
+    until = now - MIN_PAYMENT_AGE
+    semaphore = asyncio.Semaphore(concurrency)
+    counters = {'checked': 0, PAYMENT_EVENT_PAID: 0, PAYMENT_EVENT_CANCEL: 0, 'errors': 0}
+
+    async def reconcile(payment):
+        platform = PaymentPlatform(payment.type)
+        async with semaphore:
+            try:
+                status = await _fetch_status(platform, payment.payment_id)
+            except Exception as e:
+                counters['errors'] += 1
+                logging.warning(f"Reconciler: failed to fetch {platform.name} status for payment {payment.payment_id}: {e}")
+                return
+        counters['checked'] += 1
+
+        event = STATUS_EVENTS[platform].get(status)
+        if event is None:
+            return
+        try:
+            inserted = await add_payment_inbox_event(platform, payment.payment_id, payment.tg_id, event)
+        except Exception as e:
+            counters['errors'] += 1
+            logging.error(f"Reconciler: failed to store {event} event for payment {payment.payment_id}: {e}", exc_info=True)
+            return
+        if inserted:
+            counters[event] += 1
+            logging.info(f"Reconciler: recovered missed {platform.name} '{status}' for payment {payment.payment_id} of user {payment.tg_id}")
+
+    after = None
+    while True:
+        payments = await get_unreconciled_payments_page(platforms, since, until, after, PAGE_SIZE)
+        if not payments:
+            break
+        await asyncio.gather(*(reconcile(payment) for payment in payments))
+        after = (payments[-1].created_at, payments[-1].id)
+        if len(payments) < PAGE_SIZE:
+            break
+
+    logging.info(
+        f"Payment reconciliation completed in {time.monotonic() - started:.2f}s: checked={counters['checked']}, "
+        f"paid={counters[PAYMENT_EVENT_PAID]}, cancelled={counters[PAYMENT_EVENT_CANCEL]}, errors={counters['errors']}"
+    )
+    return counters
+
+class PaymentReconciler:
+    def __init__(self, on_recovered: Callable[[], None], interval: float = None):
+        self.on_recovered = on_recovered
+        self.interval = interval or glv.config['PAYMENT_RECONCILE_INTERVAL'] * 60
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logging.info(f"Payment reconciler started, running every {self.interval:.0f}s")
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                result = await reconcile_payments()
+                if result[PAYMENT_EVENT_PAID] or result[PAYMENT_EVENT_CANCEL]:
+                    self.on_recovered()
+            except Exception as e:
+                logging.error(f"Error in payment reconciliation: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
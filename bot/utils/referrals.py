@@ -8,7 +8,8 @@ from sqlalchemy import select, func, insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.models import VPNUsers, ReferralBonus, Payments
-from db.methods import engine, get_vpn_user
+from db.methods import engine, read_replica, unit_of_work, get_vpn_user
+from db.user_context import invalidate_user_context
 from utils.ephemeral import EphemeralNotification
 from utils.lang import get_i18n_string
 from keyboards.referral import get_referral_notification_keyboard
@@ -21,15 +22,13 @@ def generate_referral_code() -> str:
     return ''.join(secrets.choice(REFERRAL_CODE_ALPHABET) for _ in range(REFERRAL_CODE_LENGTH))
 
 async def ensure_referral_code(tg_id: int) -> Optional[str]:
-    async with engine.connect() as conn:
-        sql_query = select(VPNUsers).where(VPNUsers.tg_id == tg_id)
-        result = (await conn.execute(sql_query)).fetchone()
-        
-        if not result:
-            return None
-        
-        if result.referral_code:
-            return result.referral_code
+    result = await get_vpn_user(tg_id)
+    
+    if not result:
+        return None
+    
+    if result.referral_code:
+        return result.referral_code
     
     for attempt in range(25):
         code = generate_referral_code()
@@ -39,16 +38,17 @@ async def ensure_referral_code(tg_id: int) -> Optional[str]:
             existing = (await conn.execute(check_query)).fetchone()
             
             if not existing:
-                async with engine.begin() as conn:
+                async with unit_of_work() as conn:
                     update_query = update(VPNUsers).where(VPNUsers.tg_id == tg_id).values(referral_code=code)
                     await conn.execute(update_query)
+                invalidate_user_context(tg_id)
                 return code
     
     logging.error(f"Failed to generate unique referral code for user {tg_id} after 25 attempts")
     return None
 
 async def get_user_by_referral_code(code: str) -> Optional[VPNUsers]:
-    async with engine.connect() as conn:
+    async with read_replica() as conn:
         sql_query = select(VPNUsers).where(VPNUsers.referral_code == code.upper())
         result = (await conn.execute(sql_query)).fetchone()
     return result
@@ -57,14 +57,15 @@ async def set_referrer(tg_id: int, referrer_id: int) -> bool:
     if tg_id == referrer_id:
         return False
     
-    async with engine.begin() as conn:
+    async with unit_of_work() as conn:
         update_query = update(VPNUsers).where(VPNUsers.tg_id == tg_id).values(referred_by_id=referrer_id)
         await conn.execute(update_query)
+    invalidate_user_context(tg_id)
     
     return True
 
 async def get_referral_stats(tg_id: int) -> Dict:
-    async with engine.connect() as conn:
+    async with read_replica() as conn:
         invited_query = select(func.count()).select_from(VPNUsers).where(VPNUsers.referred_by_id == tg_id)
         invited_count = (await conn.execute(invited_query)).scalar() or 0
         
@@ -126,6 +127,7 @@ async def apply_referral_bonuses(referee_id: int, purchase_days: int, payment_id
                             'expireAt': new_expire.isoformat().replace('+00:00', 'Z')
                         }
                         await panel.client.patch("/users", json=update_payload)
+                        panel.invalidate_panel_user(tg_id=inviter_id)
 
                         try:
                             inviter_chat = await glv.bot.get_chat(inviter_id)
@@ -160,10 +162,11 @@ async def apply_referral_bonuses(referee_id: int, purchase_days: int, payment_id
                             'expireAt': new_expire.isoformat().replace('+00:00', 'Z')
                         }
                         await panel.client.patch("/users", json=update_payload)
+                        panel.invalidate_panel_user(tg_id=referee_id)
             except Exception as e:
                 logging.error(f"Failed to apply bonus to referee {referee_id}: {e}")
 
-        async with engine.begin() as conn:
+        async with unit_of_work() as conn:
             await conn.execute(
                 insert(ReferralBonus).values(
                     inviter_id=inviter_id,
@@ -188,7 +191,7 @@ async def apply_referral_bonuses(referee_id: int, purchase_days: int, payment_id
     }
 
 async def get_admin_referral_stats() -> Dict:
-    async with engine.connect() as conn:
+    async with read_replica() as conn:
         total_referrers_query = select(func.count(func.distinct(VPNUsers.tg_id))).select_from(VPNUsers).where(VPNUsers.referred_by_id.isnot(None))
         total_referrals = (await conn.execute(total_referrers_query)).scalar() or 0
         
@@ -235,7 +238,7 @@ async def get_admin_referral_stats() -> Dict:
 async def get_referrers_list(page: int = 1, per_page: int = 5) -> Dict:
     offset = (page - 1) * per_page
     
-    async with engine.connect() as conn:
+    async with read_replica() as conn:
         referrers_query = select(
             VPNUsers.referred_by_id,
             func.count(VPNUsers.tg_id).label('referrals_count'),
@@ -276,7 +279,7 @@ async def get_referrers_list(page: int = 1, per_page: int = 5) -> Dict:
 async def get_user_referrals(user_id: int, page: int = 1, per_page: int = 5) -> Dict:
     offset = (page - 1) * per_page
     
-    async with engine.connect() as conn:
+    async with read_replica() as conn:
         referrals_query = select(
             VPNUsers.tg_id,
             func.count(Payments.id).label('purchases'),
@@ -1,105 +1,152 @@
+import time
+import asyncio
 import logging
 from datetime import datetime, timedelta
 from aiogram import Bot
 
-from db.methods import get_all_active_users, get_last_traffic_notification, add_traffic_notification
-from db.models import VPNUsers
+from db.methods import get_all_active_users, get_recently_notified_users, add_traffic_notifications, save_user_messages
 from panel import get_panel
 from keyboards import get_buy_more_traffic_keyboard
 from utils.ephemeral import EphemeralNotification
 from utils.lang import get_i18n_string
+from utils.rate_limit import telegram_bucket
+import glv
 
 TRAFFIC_THRESHOLD = 0.75
 NOTIFICATION_COOLDOWN_HOURS = 24
+NOTIFICATION_TYPE = "traffic_75_percent"
+FLUSH_BATCH_SIZE = 100
 
-async def check_users_traffic(bot: Bot):
+def _is_over_threshold(tg_id: int, panel_profile) -> bool:
+    if not panel_profile or not panel_profile.data_limit:
+        return False
+    if panel_profile.data_limit <= 0:
+        logging.warning(f"User {tg_id}: invalid data_limit: {panel_profile.data_limit}")
+        return False
+    if panel_profile.used_traffic < 0:
+        logging.warning(f"User {tg_id}: negative used_traffic: {panel_profile.used_traffic}")
+        return False
+    return panel_profile.used_traffic / panel_profile.data_limit > TRAFFIC_THRESHOLD
+
+class _NotificationWriter:
+    def __init__(self):
+        self._notified = []
+        self._messages = []
+        self._lock = asyncio.Lock()
+
+    def add(self, tg_id: int, msg_id: int):
+        self._notified.append(tg_id)
+        self._messages.append((tg_id, msg_id, 'notification'))
+
+    @property
+    def pending(self) -> int:
+        return len(self._notified)
+
+    async def flush(self):
+        async with self._lock:
+            notified, self._notified = self._notified, []
+            messages, self._messages = self._messages, []
+            if not notified:
+                return
+            try:
+                await add_traffic_notifications(notified, NOTIFICATION_TYPE)
+            except Exception as e:
+                logging.error(f"Failed to record {len(notified)} traffic notification(s): {e}", exc_info=True)
+            try:
+                await save_user_messages(messages)
+            except Exception as e:
+                logging.warning(f"Failed to save notification messages to DB: {e}")
+
+async def _notify_user(bot: Bot, tg_id: int) -> int | None:
+    chat_member = await bot.get_chat_member(tg_id, tg_id)
+    if not chat_member:
+        return None
+
+    remaining_percent = int(round((1 - TRAFFIC_THRESHOLD) * 100))
+    message = get_i18n_string("message_reached_usage_percent", chat_member.user.language_code).format(
+        name=chat_member.user.first_name,
+        amount=remaining_percent
+    )
+    keyboard = get_buy_more_traffic_keyboard(chat_member.user.language_code, back=False, from_notification=True)
+
+    await telegram_bucket.acquire()
+    return await EphemeralNotification.send_ephemeral(
+        bot=bot,
+        chat_id=tg_id,
+        text=message,
+        reply_markup=keyboard,
+        lang=chat_member.user.language_code
+    )
+
+async def check_users_traffic(bot: Bot) -> dict:
     logging.info("Starting traffic check for all active users")
-    
+
+    timings = {}
+    started = stage_started = time.monotonic()
+
     panel = get_panel()
-    users = await get_all_active_users()
-    
-    notification_count = 0
-    error_count = 0
-    
-    for user_row in users:
-        try:
-            if hasattr(user_row, '_mapping'):
-                tg_id = user_row._mapping.get('tg_id')
-            elif hasattr(user_row, '__getitem__'):
-                tg_id = user_row[1] if len(user_row) > 1 else None
-            elif hasattr(user_row, 'tg_id'):
-                tg_id = user_row.tg_id
-            else:
-                logging.warning(f"Cannot extract tg_id from user_row. Type: {type(user_row)}, Value: {user_row}")
-                continue
-            
-            if tg_id is None:
-                logging.warning(f"tg_id is None for user_row: {user_row}")
-                continue
-            
-            panel_profile = await panel.get_panel_user(tg_id)
-            
-            if not panel_profile or not panel_profile.data_limit:
-                logging.debug(f"User {tg_id}: no profile or data_limit")
-                continue
-            
-            if panel_profile.data_limit <= 0:
-                logging.warning(f"User {tg_id}: invalid data_limit: {panel_profile.data_limit}")
-                continue
-            
-            if panel_profile.used_traffic < 0:
-                logging.warning(f"User {tg_id}: negative used_traffic: {panel_profile.used_traffic}")
-                continue
-            
-            traffic_usage = panel_profile.used_traffic / panel_profile.data_limit
-            logging.info(f"User {tg_id}: traffic usage {traffic_usage*100:.1f}% ({panel_profile.used_traffic}/{panel_profile.data_limit})")
-            
-            if traffic_usage > TRAFFIC_THRESHOLD:
-                last_notification = await get_last_traffic_notification(tg_id, "traffic_75_percent")
-                
-                if last_notification:
-                    sent_at = last_notification.sent_at if hasattr(last_notification, 'sent_at') else last_notification._mapping.get('sent_at')
-                    if sent_at:
-                        time_since_last = datetime.now() - sent_at
-                        if time_since_last < timedelta(hours=NOTIFICATION_COOLDOWN_HOURS):
-                            continue
-                
-                try:
-                    chat_member = await bot.get_chat_member(tg_id, tg_id)
-                    if not chat_member:
-                        continue
-                    
-                    remaining_percent = 25
-                    message = get_i18n_string("message_reached_usage_percent", chat_member.user.language_code).format(
-                        name=chat_member.user.first_name,
-                        amount=remaining_percent
-                    )
-                    keyboard = get_buy_more_traffic_keyboard(chat_member.user.language_code, back=False, from_notification=True)
-                    
-                    msg_id = await EphemeralNotification.send_ephemeral(
-                        bot=bot,
-                        chat_id=tg_id,
-                        text=message,
-                        reply_markup=keyboard,
-                        lang=chat_member.user.language_code
-                    )
-                    
-                    if msg_id:
-                        await add_traffic_notification(tg_id, "traffic_75_percent")
-                        from db.methods import save_user_message
-                        try:
-                            await save_user_message(tg_id, msg_id, 'notification')
-                        except Exception as e:
-                            logging.warning(f"Failed to save notification message to DB: {e}")
-                        notification_count += 1
-                        logging.info(f"Sent traffic notification to user {tg_id} (usage: {traffic_usage*100:.1f}%)")
-                    
-                except Exception as e:
-                    logging.warning(f"Failed to send traffic notification to user {tg_id}: {e}", exc_info=True)
-                    error_count += 1
-                    
-        except Exception as e:
-            logging.error(f"Error checking traffic for user {tg_id if 'tg_id' in locals() else 'unknown'}: {e}", exc_info=True)
-            error_count += 1
-    
-    logging.info(f"Traffic check completed. Sent: {notification_count}, Errors: {error_count}")
+    active_ids = {row.tg_id for row in await get_all_active_users() if row.tg_id is not None}
+    profiles = await panel.bulk_sync()
+    timings['fetch'] = time.monotonic() - stage_started
+
+    stage_started = time.monotonic()
+    candidates = [
+        tg_id for tg_id, panel_profile in profiles.items()
+        if tg_id in active_ids and _is_over_threshold(tg_id, panel_profile)
+    ]
+    timings['filter'] = time.monotonic() - stage_started
+
+    stage_started = time.monotonic()
+    since = datetime.now() - timedelta(hours=NOTIFICATION_COOLDOWN_HOURS)
+    recently_notified = await get_recently_notified_users(candidates, NOTIFICATION_TYPE, since)
+    recipients = [tg_id for tg_id in candidates if tg_id not in recently_notified]
+    timings['cooldown'] = time.monotonic() - stage_started
+
+    stage_started = time.monotonic()
+    queue: asyncio.Queue = asyncio.Queue()
+    for tg_id in recipients:
+        queue.put_nowait(tg_id)
+
+    writer = _NotificationWriter()
+    counters = {'sent': 0, 'errors': 0}
+
+    async def worker():
+        while True:
+            try:
+                tg_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                msg_id = await _notify_user(bot, tg_id)
+                if msg_id:
+                    writer.add(tg_id, msg_id)
+                    counters['sent'] += 1
+                    logging.info(f"Sent traffic notification to user {tg_id} (usage: {profiles[tg_id].used_traffic / profiles[tg_id].data_limit * 100:.1f}%)")
+                    if writer.pending >= FLUSH_BATCH_SIZE:
+                        await writer.flush()
+            except Exception as e:
+                logging.warning(f"Failed to send traffic notification to user {tg_id}: {e}", exc_info=True)
+                counters['errors'] += 1
+
+    workers = max(1, min(glv.config['TRAFFIC_CHECK_WORKERS'], len(recipients)))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    timings['send'] = time.monotonic() - stage_started
+
+    stage_started = time.monotonic()
+    await writer.flush()
+    timings['flush'] = time.monotonic() - stage_started
+    timings['total'] = time.monotonic() - started
+
+    logging.info(
+        f"Traffic check completed. Profiles: {len(profiles)}, over threshold: {len(candidates)}, "
+        f"in cooldown: {len(recently_notified)}, sent: {counters['sent']}, errors: {counters['errors']}; "
+        + ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in timings.items())
+    )
+    return {
+        'profiles': len(profiles),
+        'candidates': len(candidates),
+        'cooldown': len(recently_notified),
+        'sent': counters['sent'],
+        'errors': counters['errors'],
+        'timings': timings,
+    }
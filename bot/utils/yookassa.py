@@ -1,18 +1,57 @@
+import uuid
 import asyncio
-import concurrent.futures
-import functools
+import logging
 
-from yookassa import Configuration
-from yookassa import Payment
-
-_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="yookassa")
+import httpx
 
 from db.methods import add_payment, get_user_promo_discount, PaymentPlatform
 from utils import goods
+from utils.bot_info import get_bot_username
 import glv
 
-if glv.config['YOOKASSA_SHOPID'] and glv.config['YOOKASSA_TOKEN']:
-    Configuration.configure(glv.config['YOOKASSA_SHOPID'], glv.config['YOOKASSA_TOKEN'])
+API_URL = "https://api.yookassa.ru/v3"
+MAX_ATTEMPTS = 3
+
+_client: httpx.AsyncClient = None
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=API_URL,
+            auth=(str(glv.config['YOOKASSA_SHOPID']), glv.config['YOOKASSA_TOKEN'] or ''),
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        )
+    return _client
+
+async def close():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def _request(method: str, path: str, payload: dict = None, idempotence_key: str = None) -> dict:
+    client = _get_client()
+    headers = {"Idempotence-Key": idempotence_key} if idempotence_key else None
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            response = await client.request(method, path, json=payload, headers=headers)
+            if response.status_code < 500:
+                response.raise_for_status()
+                return response.json()
+            logging.warning(f"YooKassa {path} returned {response.status_code}, attempt {attempt + 1}/{MAX_ATTEMPTS}")
+            if attempt == MAX_ATTEMPTS - 1:
+                response.raise_for_status()
+        except httpx.TransportError as e:
+            logging.warning(f"YooKassa {path} request failed: {e}, attempt {attempt + 1}/{MAX_ATTEMPTS}")
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+        await asyncio.sleep(0.5 * (attempt + 1))
+
+async def get_payment_status(payment_id: str) -> str:
+    resp = await _request("GET", f"/payments/{payment_id}")
+    return resp["status"]
 
 async def create_payment(tg_id: int, callback: str, lang_code: str, amount_override: int = None) -> dict:
     target_callback = callback[len(goods.UPGRADE_PREFIX):] if callback.startswith(goods.UPGRADE_PREFIX) else callback
@@ -22,7 +61,7 @@ async def create_payment(tg_id: int, callback: str, lang_code: str, amount_overr
     else:
         discount = await get_user_promo_discount(tg_id)
         price = int(good['price']['ru'] * (1 - discount / 100))
-    bot_username = (await glv.bot.get_me()).username
+    bot_username = await get_bot_username()
     payload = {
         "amount": {
             "value": price,
@@ -52,10 +91,9 @@ async def create_payment(tg_id: int, callback: str, lang_code: str, amount_overr
             ]
         }
     }
-    loop = asyncio.get_running_loop()
-    resp = await loop.run_in_executor(_executor, functools.partial(Payment.create, payload))
+    resp = await _request("POST", "/payments", payload, str(uuid.uuid4()))
     return {
-        "url": resp.confirmation.confirmation_url,
-        "amount": resp.amount.value,
-        "payment_id": resp.id
+        "url": resp["confirmation"]["confirmation_url"],
+        "amount": float(resp["amount"]["value"]),
+        "payment_id": resp["id"]
     }